@@ -1,9 +1,12 @@
 from flask import Flask
 from flask.ext import restful
 from nlp_client.services import *
-from nlp_client.caching import useCaching
+from nlp_client.caching import useCaching, configure_parse_cache
+from nlp_client.title_confirmation import use_title_index
+from nlp_client import solr
 import json
 import sys
+import os
 
 app = Flask(__name__)
 api = restful.Api(app)
@@ -20,7 +23,7 @@ api.add_resource(EntitiesService,           '/doc/<string:doc_id>/entities')
 api.add_resource(EntityCountsService,       '/doc/<string:doc_id>/entity_counts')
 api.add_resource(SolrWikiService,           '/wiki/<string:wiki_id>/solr')
 api.add_resource(WikiEntitiesService,       '/wiki/<string:wiki_id>/entities')
-api.add_resource(ListDocIdsService,         '/wiki/<string:wiki_id>/docs/') #todo: get start & offset working
+api.add_resource(ListDocIdsService,         '/wiki/<string:wiki_id>/docs/') #todo: expose ListDocIdsService.page
 api.add_resource(TopEntitiesService,        '/wiki/<string:wiki_id>/top_entities')
 api.add_resource(HeadsCountService,         '/wiki/<string:wiki_id>/head_counts')
 api.add_resource(TopHeadsService,           '/wiki/<string:wiki_id>/top_heads')
@@ -28,4 +31,9 @@ api.add_resource(TopHeadsService,           '/wiki/<string:wiki_id>/top_heads')
 if __name__ == '__main__':
     if len(sys.argv) > 1:
         useCaching()
+    if os.path.exists('nlp-config.json'):
+        configure_parse_cache('nlp-config.json')
+        solr.configure('nlp-config.json')
+    if os.path.exists('wp_titles.idx'):
+        use_title_index('wp_titles.idx')
     app.run(debug=True, host='0.0.0.0')
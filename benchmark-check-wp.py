@@ -0,0 +1,86 @@
+"""
+Times wikipedia title confirmation over the noun phrases of real CoreNLP parses, comparing the old
+per-phrase lookup with title_confirmation.check_wp and the batched check_wp_many, and with
+check_wp against the memory-mapped title index if wp_titles.idx is there too.
+Run from the directory holding wp_titles.db.
+Usage: python benchmark-check-wp.py /data/xml/<wid>/ [iterations]
+Accepts a directory (searched recursively) or individual .xml/.xml.gz files.
+"""
+
+from nlp_client.services import PhraseService
+from nlp_client import corenlp_xml, title_confirmation
+from nltk.corpus import stopwords
+import time
+import sys
+import os
+import re
+
+
+def load_documents(paths):
+    ''' One list of noun phrases per document, in document order '''
+    return [[np for parse in corenlp_xml.sentence_parses(corenlp_xml.parse(xml))
+             for np in PhraseService.phrases_from_parse(parse, [u'NP'])]
+            for xml in corenlp_xml.iter_files(paths)]
+
+
+LEGACY_SEEN = []
+
+def legacy_preprocess(title):
+    stops = stopwords.words('english')
+    return ' '.join(filter(lambda x: x not in stops, re.sub(' \(\w+\)', '', title.lower().replace('_', ' ')).split(' ')))[:500]
+
+def legacy_check_wp(title):
+    global LEGACY_SEEN
+    ppt = legacy_preprocess(title)
+    if ppt in LEGACY_SEEN:
+        return True
+    cursor = title_confirmation.get_sqlite_connection().cursor()
+    cursor.execute("SELECT * FROM `titles` where `title` = \"%s\"" % (ppt.replace('"', '""')))
+    if cursor.fetchone() is not None:
+        LEGACY_SEEN += [ppt]
+        return True
+    return False
+
+
+def per_phrase(check):
+    def run(documents):
+        return [set([np for np in nps if check(np)]) for nps in documents]
+    return run
+
+def batched(documents):
+    return [title_confirmation.check_wp_many(nps) for nps in documents]
+
+
+def bench(name, func, documents, iterations, reset):
+    results = None
+    start = time.time()
+    for i in range(iterations):
+        reset()
+        results = func(documents)
+    elapsed = time.time() - start
+    phrases = sum(map(len, documents)) * iterations
+    print "%-30s %8.3fs total %8.3fus/phrase" % (name, elapsed, 1000000 * elapsed / phrases)
+    return results
+
+
+def reset_legacy():
+    global LEGACY_SEEN
+    LEGACY_SEEN = []
+
+
+args = [a for a in sys.argv[1:] if not a.isdigit()]
+iterations = int(([a for a in sys.argv[1:] if a.isdigit()] or [3])[0])
+documents = load_documents(args)
+print "%d documents, %d noun phrases, %d distinct, %d iterations" % (
+    len(documents), sum(map(len, documents)), len(set([np for nps in documents for np in nps])), iterations)
+
+expected = bench('legacy check_wp', per_phrase(legacy_check_wp), documents, iterations, reset_legacy)
+cold = bench('check_wp (cold memos)', per_phrase(title_confirmation.check_wp), documents, iterations, title_confirmation.clear_memos)
+warm = bench('check_wp (warm memos)', per_phrase(title_confirmation.check_wp), documents, iterations, lambda: None)
+many = bench('check_wp_many (cold memos)', batched, documents, iterations, title_confirmation.clear_memos)
+print "%d mismatched documents" % len([i for i in range(len(documents)) if not expected[i] == cold[i] == warm[i] == many[i]])
+
+if os.path.exists('wp_titles.idx'):
+    title_confirmation.use_title_index('wp_titles.idx')
+    indexed = bench('check_wp (title index)', per_phrase(title_confirmation.check_wp), documents, iterations, title_confirmation.clear_memos)
+    print "%d mismatched documents" % len([i for i in range(len(documents)) if expected[i] != indexed[i]])
@@ -0,0 +1,52 @@
+"""
+Times the per-document cost of EntitiesService's title and redirect checks on one wiki,
+comparing membership in the JSON title list with the typed per-wiki forms from wiki_titles/wiki_redirects.
+Needs the wiki's titles, redirects and noun phrases in the S3 cache.
+Usage: python benchmark-entities.py [wiki_id] [num_docs]
+Defaults to the first wiki in topwams.txt and 100 documents.
+"""
+
+from nlp_client.services import AllTitlesService, RedirectsService, AllNounPhrasesService, ListDocIdsService, wiki_titles, wiki_redirects
+from nlp_client.caching import useCaching
+from nlp_client import title_confirmation
+import time
+import sys
+
+wiki_id = sys.argv[1] if len(sys.argv) > 1 else open('topwams.txt').readline().strip()
+num_docs = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+useCaching(dontCompute=True)
+
+doc_ids = ListDocIdsService().nestedGet(wiki_id, [])[:num_docs]
+documents = [map(title_confirmation.preprocess, AllNounPhrasesService().nestedGet(doc_id, [])) for doc_id in doc_ids]
+print "wiki %s: %d documents, %d noun phrases" % (wiki_id, len(documents), sum(map(len, documents)))
+
+
+def list_lookup(wiki_id, nps):
+    titles = AllTitlesService().nestedGet(wiki_id, [])
+    redirects = RedirectsService().nestedGet(wiki_id, {})
+    checked_titles = filter(lambda x: x in titles, nps)
+    return list(set(checked_titles)), dict(filter(lambda x: x[1], map(lambda x: (x, redirects.get(x, None)), checked_titles)))
+
+
+def typed_lookup(wiki_id, nps):
+    titles = wiki_titles(wiki_id)
+    redirects = wiki_redirects(wiki_id)
+    checked_titles = [title for title in nps if title in titles]
+    return list(set(checked_titles)), dict([(title, redirects[title]) for title in checked_titles if redirects.get(title)])
+
+
+def bench(name, func):
+    results = []
+    start = time.time()
+    for nps in documents:
+        results.append(func(wiki_id, nps))
+    elapsed = time.time() - start
+    print "%-20s %8.3fs total %8.3fms/doc" % (name, elapsed, 1000 * elapsed / max(len(documents), 1))
+    return results
+
+
+typed = bench('frozenset', typed_lookup)
+listed = bench('json list', list_lookup)
+print "%d mismatched documents" % len([i for i in range(len(documents))
+                                       if sorted(typed[i][0]) != sorted(listed[i][0]) or typed[i][1] != listed[i][1]])
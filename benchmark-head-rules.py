@@ -0,0 +1,66 @@
+"""
+Times mrg_utils head finding over the constituency parses of real CoreNLP documents: building each
+sentence's tree, re-running the head rules alone on every constituent of the built trees, and finding
+just the sentence's terminal head with a lazy sentence, as HeadsService does.
+To check a change to the head rules leaves HeadsService's output alone, run with --save before it
+and --check after it; both write or read the heads HeadsService would give, one per sentence.
+Usage: python benchmark-head-rules.py /data/xml/<wid>/ [iterations] [--save heads.json | --check heads.json]
+Accepts a directory (searched recursively) or individual .xml/.xml.gz files.
+"""
+
+from nlp_client import corenlp_xml, title_confirmation
+from nlp_client.mrg_utils import Sentence
+import json
+import time
+import sys
+
+
+def constituents(sentence):
+    nodes = []
+    stack = [sentence.nodes]
+    while stack:
+        node = stack.pop()
+        if node.children:
+            nodes.append(node)
+            stack.extend(node.children)
+    return nodes
+
+
+def bench(name, func, items, iterations, unit):
+    best = None
+    for i in range(iterations):
+        start = time.time()
+        for item in items:
+            func(item)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print "%-20s %8.3fs best %8.3fus/%s" % (name, best, 1000000 * best / max(len(items), 1), unit)
+
+
+args = sys.argv[1:]
+save = check = None
+if '--save' in args:
+    save = args.pop(args.index('--save') + 1)
+    args.remove('--save')
+if '--check' in args:
+    check = args.pop(args.index('--check') + 1)
+    args.remove('--check')
+iterations = int(([a for a in args if a.isdigit()] or [5])[0])
+parses = [parse for xml in corenlp_xml.iter_files([a for a in args if not a.isdigit()])
+          for parse in corenlp_xml.sentence_parses(corenlp_xml.parse(xml))]
+
+sentences = [Sentence(p) for p in parses]
+nodes = [node for sentence in sentences for node in constituents(sentence)]
+print "%d parses, %d constituents, %d iterations" % (len(parses), len(nodes), iterations)
+
+bench('build sentences', Sentence, parses, iterations, 'sentence')
+bench('head rules', lambda node: node.getHead(), nodes, iterations, 'constituent')
+bench('lazy term head', lambda p: Sentence(p, lazy=True).getTermHead(), parses, iterations, 'sentence')
+
+heads = [title_confirmation.preprocess(Sentence(p, lazy=True).getTermHead().string) for p in parses]
+if save:
+    json.dump(heads, open(save, 'w'))
+if check:
+    expected = json.load(open(check))
+    print "%d mismatched heads" % len([i for i in range(max(len(heads), len(expected)))
+                                       if i >= len(heads) or i >= len(expected) or heads[i] != expected[i]])
@@ -0,0 +1,37 @@
+"""
+Times PhraseService.phrases_from_parse against nltk.Tree on a set of real CoreNLP parses.
+test_phrases.py checks that they agree.
+Usage: python benchmark-phrases.py /data/xml/<wid>/ [iterations]
+Accepts a directory (searched recursively) or individual .xml/.xml.gz files.
+"""
+
+from nlp_client.services import PhraseService
+from nlp_client import corenlp_xml
+import nltk
+import time
+import sys
+
+LABEL_SETS = [frozenset(['NP']), frozenset(['VP']), frozenset(['NP', 'NN', 'NNS', 'NNP', 'NNPS'])]
+
+
+def nltk_phrases(parse, phrase_types):
+    return [' '.join(f.leaves()) for f in nltk.Tree.parse(parse).subtrees() if f.node in phrase_types]
+
+
+def bench(name, func, parses, iterations):
+    start = time.time()
+    for i in range(iterations):
+        for parse in parses:
+            for labels in LABEL_SETS:
+                func(parse, labels)
+    elapsed = time.time() - start
+    print "%-30s %8.3fs total %8.3fms/sentence" % (name, elapsed, 1000 * elapsed / (len(parses) * iterations))
+
+
+args = [a for a in sys.argv[1:] if not a.isdigit()]
+iterations = int(([a for a in sys.argv[1:] if a.isdigit()] or [3])[0])
+parses = [parse for xml in corenlp_xml.iter_files(args) for parse in corenlp_xml.sentence_parses(corenlp_xml.parse(xml))]
+print "%d sentences, %d iterations" % (len(parses), iterations)
+
+bench('nltk.Tree.subtrees', nltk_phrases, parses, iterations)
+bench('PhraseService.phrases_from_parse', PhraseService.phrases_from_parse, parses, iterations)
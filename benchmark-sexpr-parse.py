@@ -0,0 +1,71 @@
+"""
+Times mrg_utils.sexpr_parse over the constituency parses of real CoreNLP documents, comparing the old
+character-by-character tokenizer with the split() tokenizer, and checks they build the same nested lists.
+Reports the best of the iterations, to keep garbage collection pauses and other noise out of the comparison.
+Usage: python benchmark-sexpr-parse.py /data/xml/<wid>/ [iterations]
+Accepts a directory (searched recursively) or individual .xml/.xml.gz files.
+"""
+
+from nlp_client import corenlp_xml
+from nlp_client.mrg_utils import sexpr_parse
+import time
+import sys
+
+
+def legacy_tokens(line):
+    line_len = len(line)
+    left = 0
+    while left < line_len:
+        c = line[left]
+        if c.isspace():
+            left += 1
+        elif c in '()':
+            yield c
+            left += 1
+        else:
+            right = left + 1
+            while right < line_len:
+                c = line[right]
+                if c.isspace() or c in '()':
+                    break
+                right += 1
+            yield line[left:right]
+            left = right
+
+
+def legacy_parse_string(line):
+    stack = []
+    for token in legacy_tokens(line):
+        if token == '(':
+            stack.append([])
+        elif token == ')':
+            top = stack.pop()
+            if len(stack) == 0:
+                yield top
+            else:
+                stack[-1].append(top)
+        else:
+            stack[-1].append(token)
+    assert len(stack) == 0
+
+
+def bench(name, parse, parses, iterations):
+    results = None
+    best = None
+    for i in range(iterations):
+        start = time.time()
+        results = [list(parse(p)) for p in parses]
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print "%-20s %8.3fs best %8.3fus/parse" % (name, best, 1000000 * best / len(parses))
+    return results, best
+
+
+args = [a for a in sys.argv[1:] if not a.isdigit()]
+iterations = int(([a for a in sys.argv[1:] if a.isdigit()] or [5])[0])
+parses = [parse for xml in corenlp_xml.iter_files(args) for parse in corenlp_xml.sentence_parses(corenlp_xml.parse(xml))]
+print "%d parses, %d characters, %d iterations" % (len(parses), sum(map(len, parses)), iterations)
+
+expected, legacy_time = bench('legacy', legacy_parse_string, parses, iterations)
+actual, split_time = bench('split', sexpr_parse.parse_string, parses, iterations)
+print "%.1fx faster, %d mismatched parses" % (legacy_time / split_time, len([i for i in range(len(parses)) if expected[i] != actual[i]]))
@@ -0,0 +1,28 @@
+"""
+Compares xmltodict against nlp_client.corenlp_xml on a set of real CoreNLP parses.
+Usage: python benchmark-xml-reader.py /data/xml/<wid>/ [iterations]
+Accepts a directory (searched recursively) or individual .xml/.xml.gz files.
+"""
+
+from nlp_client import corenlp_xml
+import xmltodict
+import time
+import sys
+
+
+def bench(name, func, docs, iterations):
+    start = time.time()
+    for i in range(iterations):
+        for doc in docs:
+            func(doc)
+    elapsed = time.time() - start
+    print "%-40s %8.3fs total %8.3fms/doc" % (name, elapsed, 1000 * elapsed / (len(docs) * iterations))
+
+
+args = [a for a in sys.argv[1:] if not a.isdigit()]
+iterations = int(([a for a in sys.argv[1:] if a.isdigit()] or [3])[0])
+docs = list(corenlp_xml.iter_files(args))
+print "%d documents, %d bytes, %d iterations" % (len(docs), sum(map(len, docs)), iterations)
+
+bench('xmltodict.parse', xmltodict.parse, docs, iterations)
+bench('corenlp_xml.parse', corenlp_xml.parse, docs, iterations)
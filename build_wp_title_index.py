@@ -0,0 +1,24 @@
+"""
+Builds the memory-mapped wikipedia title index used by title_confirmation.use_title_index.
+Usage: python build_wp_title_index.py [source] [wp_titles.idx]
+The source is either wp_titles.db, whose titles are already preprocessed, or a gzipped
+all-titles-in-ns0 dump, which gets preprocessed here. Defaults to wp_titles.db.
+"""
+
+from nlp_client import title_confirmation as tc
+from nlp_client import title_index
+from gzip import open as gzopen
+import sqlite3 as lite
+import sys
+
+source = sys.argv[1] if len(sys.argv) > 1 else 'wp_titles.db'
+path = sys.argv[2] if len(sys.argv) > 2 else 'wp_titles.idx'
+
+if source.endswith('.gz'):
+    titles = (tc.preprocess(line.strip()) for line in gzopen(source))
+else:
+    conn = lite.connect(source)
+    conn.text_factory = str
+    titles = (row[0] for row in conn.execute("SELECT `title` FROM `titles`"))
+
+print "Wrote %d titles to %s" % (title_index.build(titles, path), path)
@@ -1,7 +1,6 @@
-from nlp_services.syntax import AllNounPhrasesService, AllVerbPhrasesService, HeadsService
-from nlp_services.discourse.entities import CoreferenceCountsService, EntityCountsService
-from nlp_services.discourse.sentiment import DocumentSentimentService, DocumentEntitySentimentService, WpDocumentEntitySentimentService
-from nlp_services.caching import use_caching
+from nlp_client.pipeline import DocumentPipeline
+from nlp_client.caching import useCaching
+from nlp_client import aggregates
 from multiprocessing import Pool
 from boto.s3.connection import S3Connection
 from boto.s3.key import Key
@@ -18,8 +17,11 @@ BUCKET = boto.connect_s3().get_bucket('nlp-data')
 
 service_file = sys.argv[2] if len(sys.argv) > 2 else 'services-config.json'
 SERVICES = json.loads(open(service_file).read())['services']
+# wiki aggregates are kept up to date from these, so they're always recomputed too
+SERVICES += [service for service in aggregates.DEPENDENT_SERVICES if service not in SERVICES]
 
-use_caching(per_service_cache=dict([(service+'.get', {'write_only': True}) for service in SERVICES]))
+useCaching(perServiceCaching=dict([(service+'.get', {'write_only': True}) for service in SERVICES]))
+PIPELINE = DocumentPipeline(SERVICES)
 
 def process_file(filename):
     if filename.strip() == '':
@@ -31,14 +33,25 @@ def process_file(filename):
         return
 
     doc_id = '%s_%s' % (match.group(1), match.group(2))
-    for service in SERVICES:
-        try:
-            getattr(sys.modules[__name__], service)().get(doc_id)
-        except KeyboardInterrupt:
-            sys.exit()
-        except Exception as e:
+    try:
+        responses = PIPELINE.run(doc_id)
+    except KeyboardInterrupt:
+        sys.exit()
+    except Exception as e:
+        print 'Could not run services on %s!' % doc_id
+        print traceback.format_exc()
+        return
+    for service, response in responses.items():
+        if 'traceback' in response:
             print 'Could not call %s on %s!' % (service, doc_id)
-            print traceback.format_exc()
+            print response['traceback']
+    try:
+        aggregates.record_document(BUCKET, doc_id, responses)
+    except KeyboardInterrupt:
+        sys.exit()
+    except Exception as e:
+        print 'Could not record aggregate deltas for %s!' % doc_id
+        print traceback.format_exc()
 
 
 def call_services(keyname):
@@ -3,22 +3,24 @@ This script transfers top entity data from AWS to Solr
 Because it's run on the Wikia side, we're only iterating over wikis with a warmed cache
 """
 
-import requests
 import json
 from boto import connect_s3
 from boto.s3.prefix import Prefix
 from multiprocessing import Pool
 from nlp_client.services import TopEntitiesService
+from nlp_client.solr import SolrClient
 
 topService = TopEntitiesService()
 
+# updates go to the indexer, not the query slaves; created in each worker so connections aren't shared
+INDEXER = None
+
 def sendToWiki(prefix):
-    global topService
-    prefix
+    global topService, INDEXER
     if isinstance(prefix, Prefix):
-        return requests.post('http://search-s11:8983/solr/xwiki/update', 
-                             json.dumps({'entities_txt':topService.nestedGet(prefix.name.split('/')[-2])})
-                             headers={'Content-type':'application/json'}).content
+        if INDEXER is None:
+            INDEXER = SolrClient(['http://search-s11:8983'])
+        return json.dumps(INDEXER.update('xwiki', {'entities_txt':topService.nestedGet(prefix.name.split('/')[-2])}))
     return None
 
 bucketList = connect_s3().bucket('nlp-data').list(prefix='service_responses/', delimiter='/')
@@ -1,10 +1,10 @@
-import requests,sys
+import sys
 from time import sleep
 from subprocess import Popen
 from random import shuffle
+from nlp_client import solr
 
-r = requests.get('http://search-s10:8983/solr/xwiki/select', params={'wt':'json', 'q':'lang_s:en', 'sort': 'wam_i desc', 'rows':'10000', 'fl':'id'})
-ids = [doc['id'] for doc in r.json()['response']['docs']]
+ids = [doc['id'] for doc in solr.client().docs('xwiki', {'q':'lang_s:en', 'sort': 'wam_i desc', 'rows':'10000', 'fl':'id'})]
 
 shuffle(ids)
 processes = []
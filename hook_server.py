@@ -2,6 +2,7 @@ from flask import Flask, request
 from flask.ext import restful
 from boto import connect_s3
 from boto.s3.key import Key
+from nlp_client import aggregates, doc_manifest
 
 import os
 import time
@@ -38,6 +39,15 @@ class EventResource(restful.Resource):
             key.delete()
         except:
             pass
+
+
+    def _deletePrefixFromS3(self, prefix):
+        ''' Deletes every key under a prefix in the nlp-data bucket
+        :param prefix: the string value of the prefix
+        '''
+
+        bucket = connect_s3().get_bucket('nlp-data')
+        bucket.delete_keys([key.name for key in bucket.list(prefix=prefix)])
         
 
 class DocEventService(EventResource):
@@ -59,6 +69,10 @@ class DocEventService(EventResource):
         '''
 
         self._deleteFromS3("xml/%s/%s.xml" % tuple(doc_id.split('_')))
+        self._deleteFromS3("parse_bin/%s/%s.bin" % tuple(doc_id.split('_')))
+        bucket = connect_s3().get_bucket('nlp-data')
+        aggregates.record_deletion(bucket, doc_id)
+        doc_manifest.record_deletion(bucket, doc_id)
         return {'status': 200}
 
 
@@ -84,6 +98,11 @@ class WikiEventService(EventResource):
             # this is just being super, super safe, because no wiki ID would delete all xml
             raise ValueError("A wiki ID is required")
         self._deleteFromS3('xml/%d/' % wiki_id)
+        self._deletePrefixFromS3('parse_bin/%d/' % wiki_id)
+        self._deletePrefixFromS3('%s/%d/' % (aggregates.AGGREGATE_PREFIX, wiki_id))
+        self._deletePrefixFromS3('%s/%d/' % (aggregates.DELTA_PREFIX, wiki_id))
+        self._deleteFromS3(doc_manifest.Manifest.key_name(wiki_id))
+        self._deletePrefixFromS3(doc_manifest.delta_prefix(wiki_id))
         return {'status': 200}
 
 
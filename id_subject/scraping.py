@@ -1,17 +1,15 @@
 import re
-import requests
 from bs4 import BeautifulSoup
 from urllib2 import urlopen
+from nlp_client import solr
 
 def guess_from_title_tag(wid):
     """Given a wiki ID, return a list containing a single string representing
     the best guess for the wiki's subject, or an empty list if not possible."""
-    response = requests.get('http://search-s10:8983/solr/main/select',
-                            params={'wt': 'json',
-                                    'q': 'wid:%s AND is_main_page:true' % wid,
-                                    'fl': 'url'})
+    docs = solr.client().docs('main', {'q': 'wid:%s AND is_main_page:true' % wid,
+                                       'fl': 'url'})
 
-    url = response.json().get('response', {}).get('docs', [{}])[0].get('url', None)
+    url = (docs or [{}])[0].get('url', None)
     html = urlopen(url).read()
     soup = BeautifulSoup(html)
     title = soup.title.string
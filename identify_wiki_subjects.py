@@ -1,9 +1,8 @@
 from __future__ import division
-import json
 import logging
 import re
-import requests
 import sys
+from nlp_client import solr
 from nlp_client.wiki_parses import main_page_nps, phrases_for_wiki_field
 from id_subject import BinaryField, TermFreqField, preprocess, to_list
 from id_subject import build_dict_with_original_values
@@ -18,20 +17,15 @@ sh = logging.StreamHandler()
 sh.setLevel(logging.INFO)
 log.addHandler(sh)
 
-SOLR = 'http://search-s10:8983/solr/xwiki/select'
-
 def identify_subject(wid, terms_only=False):
     """For a given wiki ID, return a comma-separated list of top-scoring
     subjects."""
     # Request data from Solr
     params = {'q': 'id:%s' % wid,
               'fl': 'url,hostname_s,domains_txt,top_articles_txt,' +
-                    'top_categories_txt',
-              'wt': 'json'}
+                    'top_categories_txt'}
 
-    r = requests.get(SOLR, params=params)
-    j = json.loads(r.content)
-    docs = j['response']['docs']
+    docs = solr.client().select('xwiki', params)['response']['docs']
     # Handle 0 docs response
     if not docs:
         if terms_only:
@@ -0,0 +1,272 @@
+from collections import defaultdict
+from boto.exception import S3ResponseError
+from fanout import Reducer
+import uuid
+import json
+import time
+
+'''
+Persisted wiki-level aggregates that can be updated one document at a time.
+Each aggregate keeps every document's contribution, so a re-parsed or deleted document is
+applied as a delta instead of recomputing the whole wiki.
+
+Writers (the caching pipeline, the hook server) never touch the aggregate itself. They drop an
+idempotent per-document delta under aggregate_deltas/, and readers fold pending deltas in when
+they load the aggregate. Folding a delta twice has the same effect as folding it once.
+
+Every delta gets a key of its own, so a folder only ever deletes the deltas it read and applied.
+Saves are conditional on the aggregate being unchanged since it was loaded; a folder that loses
+the race reloads the winner's aggregate and folds again.
+'''
+
+AGGREGATE_PREFIX = 'aggregates'
+DELTA_PREFIX = 'aggregate_deltas'
+
+'''
+Times a fold reloads and retries after another folder saved first
+'''
+FOLD_ATTEMPTS = 5
+
+'''
+S3 statuses for a conditional write whose precondition didn't hold
+'''
+CONFLICT_STATUSES = (409, 412)
+
+'''
+Document services that feed an aggregate, mapped to the wiki services whose cached responses
+go stale when a document's contribution changes.
+'''
+DEPENDENT_SERVICES = {
+    'EntityCountsService': ['WikiEntitiesService', 'EntityDocumentCountsService', 'TopEntitiesService'],
+    'WpEntityCountsService': ['WpWikiEntitiesService', 'WpEntityDocumentCountsService', 'WpTopEntitiesService'],
+    'HeadsService': ['HeadsCountService', 'TopHeadsService'],
+}
+
+
+def document_counts(service, value):
+    ''' Turns a document service's response value into a dict of key to count
+    :param service: the name of the document service
+    :param value: the value of the service's response for the document
+    :return: a dict
+    '''
+    if value is None:
+        return {}
+    if isinstance(value, list):
+        counts = defaultdict(int)
+        for item in value:
+            counts[item] += 1
+        return dict(counts)
+    return dict(value)
+
+
+class WikiAggregate:
+
+    ''' Running totals for one document service over one wiki '''
+
+    def __init__(self, wiki_id, service, state=None):
+        ''' Constructor method
+        :param wiki_id: the id of the wiki
+        :param service: the name of the document service being aggregated
+        :param state: a dict previously produced by to_dict
+        '''
+        self.wiki_id = str(wiki_id)
+        self.service = service
+        self.etag = None
+        self.set_state(state)
+
+    def set_state(self, state):
+        ''' Replaces the totals with a dict previously produced by to_dict '''
+        state = state or {}
+        self.docs = state.get('docs', {})
+        self.counts = state.get('counts', {})
+        self.doc_counts = state.get('doc_counts', {})
+
+    @staticmethod
+    def key_name(wiki_id, service):
+        ''' Where the aggregate lives in S3 '''
+        return '%s/%s/%s.json' % (AGGREGATE_PREFIX, wiki_id, service)
+
+    @staticmethod
+    def load(bucket, wiki_id, service):
+        ''' Reads an aggregate from S3
+        :param bucket: the nlp-data bucket
+        :param wiki_id: the id of the wiki
+        :param service: the name of the document service
+        :return: a WikiAggregate, or None if it hasn't been built yet
+        '''
+        key = bucket.get_key(WikiAggregate.key_name(wiki_id, service))
+        if key is None:
+            return None
+        aggregate = WikiAggregate(wiki_id, service, json.loads(key.get_contents_as_string()))
+        aggregate.etag = key.etag
+        return aggregate
+
+    def reload(self, bucket):
+        ''' Replaces the totals with what's in S3 now, e.g. after losing a save to another folder '''
+        loaded = WikiAggregate.load(bucket, self.wiki_id, self.service)
+        if loaded is not None:
+            self.set_state(loaded.to_dict())
+            self.etag = loaded.etag
+
+    def to_dict(self):
+        return {'docs': self.docs, 'counts': self.counts, 'doc_counts': self.doc_counts}
+
+    def save(self, bucket):
+        ''' Writes the aggregate to S3, unless it changed there since it was loaded
+        :return: whether it was written
+        '''
+        etag = save_if_unchanged(bucket, WikiAggregate.key_name(self.wiki_id, self.service),
+                                 json.dumps(self.to_dict(), ensure_ascii=False), self.etag)
+        if etag is None:
+            return False
+        self.etag = etag
+        return True
+
+    def set_document(self, doc_id, counts):
+        ''' Replaces a document's contribution; used for new and re-parsed documents
+        :param doc_id: the id of the document
+        :param counts: a dict of key to count for the document
+        '''
+        self.remove_document(doc_id)
+        if not counts:
+            return
+        self.docs[doc_id] = counts
+        for key, count in counts.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+            self.doc_counts[key] = self.doc_counts.get(key, 0) + 1
+
+    def remove_document(self, doc_id):
+        ''' Subtracts a document's contribution, if it has one
+        :param doc_id: the id of the document
+        '''
+        old = self.docs.pop(doc_id, None)
+        if not old:
+            return
+        for key, count in old.items():
+            self.counts[key] = self.counts.get(key, 0) - count
+            self.doc_counts[key] = self.doc_counts.get(key, 0) - 1
+            if self.doc_counts[key] <= 0:
+                del self.counts[key]
+                del self.doc_counts[key]
+
+    def merge(self, other):
+        ''' Adds the documents of another aggregate of the same service
+        :param other: a WikiAggregate
+        '''
+        for doc_id, counts in other.docs.items():
+            self.set_document(doc_id, counts)
+
+    def fold_deltas(self, bucket):
+        ''' Applies and deletes every pending delta for this aggregate, oldest first
+        :param bucket: the nlp-data bucket
+        :return: the number of deltas folded in
+        '''
+        for attempt in range(FOLD_ATTEMPTS):
+            keys = sorted(bucket.list(prefix=delta_prefix(self.wiki_id, self.service)), key=lambda key: key.name)
+            for key in keys:
+                try:
+                    delta = json.loads(key.get_contents_as_string())
+                except S3ResponseError:
+                    continue  # someone else folded it first
+                if delta.get('deleted'):
+                    self.remove_document(delta['doc_id'])
+                else:
+                    self.set_document(delta['doc_id'], delta.get('counts', {}))
+            if not keys:
+                return 0
+            if self.save(bucket):
+                bucket.delete_keys([key.name for key in keys])
+                return len(keys)
+            self.reload(bucket)
+        return 0
+
+
+class AggregateReducer(Reducer):
+
+    ''' Builds a WikiAggregate from a document service's per-document values, for fanout.fan_out '''
+
+    def __init__(self, wiki_id, service):
+        ''' Constructor method
+        :param wiki_id: the id of the wiki
+        :param service: the name of the document service being aggregated
+        '''
+        self.wiki_id = wiki_id
+        self.service = service
+
+    def initial(self):
+        return WikiAggregate(self.wiki_id, self.service)
+
+    def add(self, total, doc_id, value):
+        total.set_document(doc_id, document_counts(self.service, value))
+        return total
+
+    def merge(self, total, partial):
+        total.merge(partial)
+        return total
+
+
+def delta_prefix(wiki_id, service):
+    return '%s/%s/%s/' % (DELTA_PREFIX, wiki_id, service)
+
+
+def delta_name(page_id):
+    ''' A key name for a page's delta that no other write will reuse. Names sort by page,
+    then in the order they were written, and start with the page id up to the first '.'.
+    :param page_id: the page id of the document
+    '''
+    return '%s.%020d.%s' % (page_id, int(time.time() * 1000000), uuid.uuid4().hex[:8])
+
+
+def save_if_unchanged(bucket, key_name, contents, etag):
+    ''' Writes a key only if it still has the etag it was read with, or doesn't exist yet if etag is None
+    :param bucket: the nlp-data bucket
+    :param key_name: the name of the key
+    :param contents: the new contents
+    :param etag: the etag the key was read with, or None for a key that wasn't there
+    :return: the key's new etag, or None if someone else wrote it first
+    '''
+    key = bucket.new_key(key_name=key_name)
+    headers = {'If-Match': etag} if etag else {'If-None-Match': '*'}
+    try:
+        key.set_contents_from_string(contents, headers=headers)
+    except S3ResponseError as e:
+        if e.status not in CONFLICT_STATUSES:
+            raise
+        return None
+    return '"%s"' % key.md5
+
+
+def write_delta(bucket, doc_id, service, counts=None):
+    ''' Records a document's new contribution to an aggregate, and purges the wiki responses it invalidates
+    :param bucket: the nlp-data bucket
+    :param doc_id: the id of the document
+    :param service: the name of the document service
+    :param counts: a dict of key to count, or None if the document was deleted
+    '''
+    wiki_id, page_id = doc_id.split('_')
+    delta = {'doc_id': doc_id, 'deleted': True} if counts is None else {'doc_id': doc_id, 'counts': counts}
+    key = bucket.new_key(key_name=delta_prefix(wiki_id, service) + delta_name(page_id))
+    key.set_contents_from_string(json.dumps(delta, ensure_ascii=False))
+    bucket.delete_keys(['service_responses/%s/%s.get' % (wiki_id, wiki_service)
+                        for wiki_service in DEPENDENT_SERVICES.get(service, [])])
+
+
+def record_document(bucket, doc_id, responses):
+    ''' Writes deltas for a freshly computed document
+    :param bucket: the nlp-data bucket
+    :param doc_id: the id of the document
+    :param responses: a dict of document service name to response, e.g. from DocumentPipeline.run
+    '''
+    for service in DEPENDENT_SERVICES:
+        response = responses.get(service)
+        if response is not None and response.get('status') == 200:
+            write_delta(bucket, doc_id, service, document_counts(service, response.get(doc_id)))
+
+
+def record_deletion(bucket, doc_id):
+    ''' Writes deltas removing a deleted document from every aggregate
+    :param bucket: the nlp-data bucket
+    :param doc_id: the id of the document
+    '''
+    for service in DEPENDENT_SERVICES:
+        write_delta(bucket, doc_id, service)
@@ -1,7 +1,15 @@
 from boto import connect_s3
 from boto.s3.key import Key
+from boto.exception import S3ResponseError
+from collections import OrderedDict
+import threading
+import Queue
+import cPickle
+import hashlib
+import socket
 import json
 import time
+import os
 
 '''
 Caching library -- basically memoizes stuff for now
@@ -17,6 +25,250 @@ READ_ONLY = False
 DONT_COMPUTE = False
 PER_SERVICE_CACHING = {}
 
+'''
+In-process tier that sits in front of the bucket. Sizes are in bytes of serialized JSON.
+'''
+LOCAL_CACHE_MAX_BYTES = 64 * 1024 * 1024
+LOCAL_CACHE_TTL = 300
+LOCAL_CACHE = None
+SERVICE_LOCAL_CACHES = {}
+
+'''
+Bounded memo of parsed documents used by ParsedJsonService. Sizes are in bytes of source XML.
+'''
+PARSE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+PARSE_CACHE_MAX_ENTRIES = 500
+PARSE_CACHE = None
+
+'''
+Most S3 reads kept in flight at once by concurrent readers, and the idle bucket connections they
+share. boto connections aren't thread-safe, so each reading thread checks out its own.
+'''
+S3_CONCURRENCY = 8
+S3_BUCKET_POOL = Queue.Queue()
+
+
+class LocalCache:
+
+    ''' Bounded, size-aware LRU cache of serialized service responses.
+    Entries expire after a TTL and the least recently used ones are evicted once max_bytes
+    (or max_entries, if set) is exceeded.
+    '''
+
+    def __init__(self, max_bytes=LOCAL_CACHE_MAX_BYTES, ttl=LOCAL_CACHE_TTL, max_entries=None):
+        ''' Constructor method
+        :param max_bytes: the most bytes of values we will hold
+        :param ttl: default number of seconds an entry is valid for, or None for no expiry
+        :param max_entries: optional cap on the number of entries
+        '''
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.current_bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        ''' Returns the value for a key, or None if it is missing or expired
+        :param key: the cache key, usually the S3 path
+        '''
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires, size = entry
+            if expires is not None and expires < time.time():
+                self.current_bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.entries[key] = entry
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None, size=None):
+        ''' Stores a value, evicting least recently used entries as needed
+        :param key: the cache key
+        :param value: the value, usually a serialized response string
+        :param ttl: optional number of seconds overriding the default ttl
+        :param size: the cost of the value in bytes; defaults to its length
+        '''
+        size = len(value) if size is None else size
+        if size > self.max_bytes:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.time() + ttl if ttl else None
+        evicted = []
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[2]
+            while self.entries and (self.current_bytes + size > self.max_bytes
+                                    or (self.max_entries and len(self.entries) >= self.max_entries)):
+                evicted_key, (evicted_value, _, evicted_size) = self.entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+                evicted.append((evicted_key, evicted_value, evicted_size))
+            self.entries[key] = (value, expires, size)
+            self.current_bytes += size
+        for evicted_key, evicted_value, evicted_size in evicted:
+            self.evicted(evicted_key, evicted_value, evicted_size)
+
+    def evicted(self, key, value, size):
+        ''' Called outside the lock for each entry pushed out by the size budget; no-op here
+        :param key: the evicted key
+        :param value: the evicted value
+        :param size: the cost the value was stored with
+        '''
+        pass
+
+    def delete_prefix(self, prefix):
+        ''' Drops every entry whose key starts with the prefix
+        :param prefix: the key prefix
+        '''
+        with self.lock:
+            for key in [key for key in self.entries if key.startswith(prefix)]:
+                self.current_bytes -= self.entries.pop(key)[2]
+
+    def clear(self):
+        ''' Empties the cache without resetting counters '''
+        with self.lock:
+            self.entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        ''' Counters for sizing the cache
+        :return: a dict of hits, misses, evictions, expirations, entries, and bytes
+        '''
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'expirations': self.expirations, 'entries': len(self.entries),
+                    'bytes': self.current_bytes, 'max_bytes': self.max_bytes,
+                    'max_entries': self.max_entries}
+
+
+class ParseCache(LocalCache):
+
+    ''' LRU cache of parsed documents that can spill evicted parses to a local directory.
+    Spilled parses are pickled and brought back into memory on the next hit.
+    '''
+
+    def __init__(self, max_bytes=PARSE_CACHE_MAX_BYTES, max_entries=PARSE_CACHE_MAX_ENTRIES,
+                 spill_dir=None, spill_max_bytes=None):
+        ''' Constructor method
+        :param max_bytes: the most bytes of source XML we will keep parsed in memory
+        :param max_entries: the most parsed documents we will keep in memory
+        :param spill_dir: directory to pickle evicted parses into, or None to drop them
+        :param spill_max_bytes: optional cap on the size of the spill directory
+        '''
+        LocalCache.__init__(self, max_bytes, None, max_entries)
+        self.spill_dir = spill_dir
+        self.spill_max_bytes = spill_max_bytes
+        self.spilled = OrderedDict()
+        self.spilled_bytes = 0
+        self.spills = 0
+        self.spill_hits = 0
+        if spill_dir is not None and not os.path.exists(spill_dir):
+            os.makedirs(spill_dir)
+
+    def spill_path(self, key):
+        ''' Where a spilled parse lives on disk; namespaced by pid since workers share a spill dir
+        :param key: the doc id
+        '''
+        return os.path.join(self.spill_dir, '%d_%s.pkl' % (os.getpid(), hashlib.sha1(key).hexdigest()))
+
+    def get(self, key):
+        ''' Returns a parse from memory, falling back to the spill directory
+        :param key: the doc id
+        '''
+        value = LocalCache.get(self, key)
+        if value is not None or self.spill_dir is None:
+            return value
+        with self.lock:
+            spilled = self.spilled.pop(key, None)
+            if spilled is None:
+                return None
+            file_size, size = spilled
+            self.spilled_bytes -= file_size
+        fname = self.spill_path(key)
+        try:
+            with open(fname, 'rb') as f:
+                value = cPickle.load(f)
+            os.remove(fname)
+        except (IOError, OSError, EOFError, cPickle.UnpicklingError):
+            return None
+        with self.lock:
+            self.spill_hits += 1
+        self.set(key, value, size=size)
+        return value
+
+    def set(self, key, value, ttl=None, size=None):
+        ''' Stores a parse, keyed by doc id
+        :param key: the doc id
+        :param value: the parsed document
+        :param ttl: ignored, parses don't go stale
+        :param size: the length of the source XML
+        '''
+        LocalCache.set(self, key, value, None, 0 if size is None else size)
+
+    def evicted(self, key, value, size):
+        ''' Pickles an evicted parse into the spill directory, trimming the oldest spills to budget
+        :param key: the doc id
+        :param value: the parsed document
+        :param size: the length of the source XML
+        '''
+        if self.spill_dir is None:
+            return
+        try:
+            with open(self.spill_path(key), 'wb') as f:
+                cPickle.dump(value, f, cPickle.HIGHEST_PROTOCOL)
+            file_size = os.path.getsize(self.spill_path(key))
+        except (IOError, OSError, cPickle.PicklingError):
+            return
+        trimmed = []
+        with self.lock:
+            self.spilled[key] = (file_size, size)
+            self.spilled_bytes += file_size
+            self.spills += 1
+            while self.spill_max_bytes and self.spilled and self.spilled_bytes > self.spill_max_bytes:
+                old_key, (old_file_size, _) = self.spilled.popitem(last=False)
+                self.spilled_bytes -= old_file_size
+                trimmed.append(old_key)
+        for old_key in trimmed:
+            try:
+                os.remove(self.spill_path(old_key))
+            except OSError:
+                pass
+
+    def clear(self):
+        ''' Empties memory and the spill directory '''
+        LocalCache.clear(self)
+        with self.lock:
+            spilled = self.spilled.keys()
+            self.spilled.clear()
+            self.spilled_bytes = 0
+        for key in spilled:
+            try:
+                os.remove(self.spill_path(key))
+            except OSError:
+                pass
+
+    def stats(self):
+        ''' Counters for sizing the cache, including the spill directory
+        :return: a dict of counters
+        '''
+        stats = LocalCache.stats(self)
+        with self.lock:
+            stats.update({'spills': self.spills, 'spill_hits': self.spill_hits,
+                          'spilled_entries': len(self.spilled), 'spilled_bytes': self.spilled_bytes})
+        return stats
+
+
 def bucket(new_bucket = None):
     ''' Access & mutate so we don't have globals in every function
     :param new_bucket:s3 bucket
@@ -68,17 +320,107 @@ def per_service_caching(services=None):
     return PER_SERVICE_CACHING
 
 
-def useCaching(writeOnly = False, readOnly = False, dontCompute=False, perServiceCaching={}):
+def local_cache(max_bytes=None, ttl=None):
+    ''' Access & mutate the in-process cache tier. Passing either value rebuilds the tier.
+    :param max_bytes: the byte budget for the shared in-process tier; 0 disables it
+    :param ttl: the default number of seconds an entry lives
+    :return: the shared LocalCache, or None if disabled
+    '''
+    global LOCAL_CACHE, LOCAL_CACHE_MAX_BYTES, LOCAL_CACHE_TTL, SERVICE_LOCAL_CACHES
+    if max_bytes is not None or ttl is not None:
+        if max_bytes is not None:
+            LOCAL_CACHE_MAX_BYTES = max_bytes
+        if ttl is not None:
+            LOCAL_CACHE_TTL = ttl
+        LOCAL_CACHE = None
+        SERVICE_LOCAL_CACHES = {}
+    if LOCAL_CACHE is None and LOCAL_CACHE_MAX_BYTES:
+        LOCAL_CACHE = LocalCache(LOCAL_CACHE_MAX_BYTES, LOCAL_CACHE_TTL)
+    return LOCAL_CACHE
+
+
+def local_cache_for_service(service):
+    ''' Gets the in-process tier for a service, honoring per-service overrides:
+    { service_name : { 'local_cache': False, 'local_max_bytes': 1024, 'local_ttl': 60 } }
+    Services that set local_max_bytes get their own LRU so they can't crowd out the others.
+    :param service: the service name, e.g. HeadsService.get
+    :return: a LocalCache, or None if the tier is disabled for this service
+    '''
+    options = per_service_caching().get(service, {})
+    if not options.get('local_cache', True):
+        return None
+    if 'local_max_bytes' not in options:
+        return local_cache()
+    if service not in SERVICE_LOCAL_CACHES:
+        SERVICE_LOCAL_CACHES[service] = LocalCache(options['local_max_bytes'], options.get('local_ttl', LOCAL_CACHE_TTL))
+    return SERVICE_LOCAL_CACHES[service]
+
+
+def local_cache_stats():
+    ''' Hit, miss, and eviction counters for every in-process tier
+    :return: a dict keyed by service name, with the shared tier keyed as "shared"
+    '''
+    stats = dict([(service, cache.stats()) for service, cache in SERVICE_LOCAL_CACHES.items()])
+    if LOCAL_CACHE is not None:
+        stats['shared'] = LOCAL_CACHE.stats()
+    return stats
+
+
+def parse_cache(new_cache=None):
+    ''' Access & mutate the memo of parsed documents used by ParsedJsonService
+    :param new_cache: a ParseCache to use from now on
+    :return: the ParseCache
+    '''
+    global PARSE_CACHE
+    if new_cache is not None:
+        PARSE_CACHE = new_cache
+    if PARSE_CACHE is None:
+        PARSE_CACHE = ParseCache()
+    return PARSE_CACHE
+
+
+def configure_parse_cache(config_file='nlp-config.json', host=None):
+    ''' Sizes the parse cache from the "parse_cache" section of a host in nlp-config.json:
+    { host : { 'parse_cache': { 'max_bytes': ..., 'max_entries': ..., 'spill_dir': ..., 'spill_max_bytes': ... } } }
+    :param config_file: path to the host config
+    :param host: the host to configure for; defaults to this machine's hostname
+    :return: the ParseCache
+    '''
+    config = json.loads(open(config_file).read()).get(host or socket.gethostname(), {}).get('parse_cache', {})
+    return parse_cache(ParseCache(config.get('max_bytes', PARSE_CACHE_MAX_BYTES),
+                                  config.get('max_entries', PARSE_CACHE_MAX_ENTRIES),
+                                  config.get('spill_dir'),
+                                  config.get('spill_max_bytes')))
+
+
+def reset_after_fork():
+    ''' Gives a forked worker process its own S3 connection and empty in-process tiers,
+    since sockets and locks inherited from the parent can't be shared with it
+    '''
+    global PARSE_CACHE, S3_BUCKET_POOL
+    if CACHE_BUCKET is not None:
+        bucket(connect_s3().get_bucket('nlp-data'))
+    S3_BUCKET_POOL = Queue.Queue()
+    local_cache(LOCAL_CACHE_MAX_BYTES)
+    if PARSE_CACHE is not None:
+        PARSE_CACHE = ParseCache(PARSE_CACHE.max_bytes, PARSE_CACHE.max_entries,
+                                 PARSE_CACHE.spill_dir, PARSE_CACHE.spill_max_bytes)
+
+
+def useCaching(writeOnly = False, readOnly = False, dontCompute=False, perServiceCaching={}, localCacheBytes=None, localCacheTtl=None):
     ''' Invoke this to set CACHE_BUCKET and enable caching on these services 
     :param write_only: whether we should avoid reading from the cache
     :param read_only: whether we should avoid writing to the cache
     :param per_service_caching: 
+    :param localCacheBytes: byte budget for the in-process tier in front of S3; 0 disables it
+    :param localCacheTtl: seconds an in-process entry lives before we go back to S3
     '''
     bucket(connect_s3().get_bucket('nlp-data'))
     read_only(readOnly)
     write_only(writeOnly)
     dont_compute(dontCompute)
     per_service_caching(perServiceCaching)
+    local_cache(localCacheBytes, localCacheTtl)
 
 
 def purgeCacheForDoc(doc_id):
@@ -88,6 +430,7 @@ def purgeCacheForDoc(doc_id):
     '''
     b = bucket()
     prefix = 'service_responses/%s' % doc_id.replace('_', '/')
+    _purge_local(prefix)
     return b.delete_keys([key for key in b.list(prefix=prefix)])
     
 
@@ -98,48 +441,285 @@ def purgeCacheForWiki(wiki_id):
     '''
     b = bucket()
     prefix = 'service_responses/%s' % wiki_id
+    _purge_local(prefix)
     return b.delete_keys([key for key in b.list(prefix=prefix)])
 
 
+def _purge_local(prefix):
+    ''' Keeps the in-process tier consistent with bucket purges
+    :param prefix: the key prefix being purged
+    '''
+    for cache in [LOCAL_CACHE] + SERVICE_LOCAL_CACHES.values():
+        if cache is not None:
+            cache.delete_prefix(prefix)
+
+
+class DocumentContext:
+
+    ''' Shares service responses between services working on the same document, and batches cache writes.
+    While a context is active on this thread, cachedServiceRequest answers repeat calls from memory
+    and queues bucket writes until flush(). Use it as a context manager to flush on exit.
+    '''
+
+    def __init__(self):
+        self.responses = {}
+        self.pending = OrderedDict()
+
+    def __enter__(self):
+        CONTEXTS.stack = getattr(CONTEXTS, 'stack', []) + [self]
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        CONTEXTS.stack = CONTEXTS.stack[:-1]
+        self.flush()
+        return False
+
+    def flush(self):
+        ''' Writes every queued response to the bucket in one batch
+        :return: the number of keys written
+        '''
+        b = bucket()
+        written = 0
+        while self.pending:
+            path, serialized = self.pending.popitem(last=False)
+            if b is not None:
+                key = b.new_key(key_name=path)
+                key.set_contents_from_string(serialized)
+                written += 1
+        return written
+
+
+CONTEXTS = threading.local()
+
+def document_context():
+    ''' The innermost active DocumentContext on this thread
+    :return: a DocumentContext, or None
+    '''
+    stack = getattr(CONTEXTS, 'stack', [])
+    return stack[-1] if stack else None
+
+
+def _request_path(self, getMethod, args, kw):
+    ''' Works out which document a service call is for and where its response lives
+    :return: a tuple of doc id, service name, and cache path
+    '''
+    doc_id = kw.get('doc_id', kw.get('wiki_id', None))
+    if not doc_id:
+        doc_id = args[0]
+    service = str(self.__class__.__name__)+'.'+getMethod.func_name
+    return doc_id, service, _response_path(doc_id, service)
+
+
+def _response_path(doc_id, service):
+    ''' Where a service's response for a document lives in the bucket
+    :param doc_id: the id of the document or wiki
+    :param service: the service name, e.g. EntityCountsService.get
+    '''
+    return 'service_responses/%s/%s' % (doc_id.replace('_', '/'), service)
+
+
+def documentScopedRequest(getMethod):
+    ''' This is a decorator that memoizes a service response only for the life of a DocumentContext,
+    for services too cheap or too large to be worth storing in the bucket
+    :param getMethod: the function we're wrapping -- should be a GET endpoint
+    '''
+    def invoke(self, *args, **kw):
+        context = document_context()
+        if context is None:
+            return getMethod(self, *args, **kw)
+        doc_id, service, path = _request_path(self, getMethod, args, kw)
+        if path not in context.responses:
+            context.responses[path] = getMethod(self, *args, **kw)
+        return context.responses[path]
+    return invoke
+
+
 def cachedServiceRequest(getMethod):
-    ''' This is a decorator responsible for optionally memoizing a service response into the cache
+    ''' This is a decorator responsible for optionally memoizing a service response into the cache.
+    Reads go to the active DocumentContext first, then the in-process tier, then the bucket.
+    Callers that already know the response isn't cached, e.g. from cachedResponses, can pass
+    known_miss=True to go straight to computing it.
     :param getMethod: the function we're wrapping -- should be a GET endpoint
     '''
     def invoke(self, *args, **kw):
 
+        known_miss = kw.pop('known_miss', False)
         b = bucket()
-        if b is None:
+        context = document_context()
+        if b is None and context is None:
             response = getMethod(self, *args, **kw)
 
         else:
-            doc_id = kw.get('doc_id', kw.get('wiki_id', None))
-            if not doc_id:
-                doc_id = args[0]
-            wiki_id = int(doc_id.split('_')[0])
-            service = str(self.__class__.__name__)+'.'+getMethod.func_name
-            path = 'service_responses/%s/%s' % (doc_id.replace('_', '/'), service)
-            
+            doc_id, service, path = _request_path(self, getMethod, args, kw)
+            if context is not None and path in context.responses:
+                return context.responses[path]
+            if b is None:
+                response = getMethod(self, *args, **kw)
+                context.responses[path] = response
+                return response
+
+            options = per_service_caching().get(service, {})
+            local = local_cache_for_service(service)
+
+            def store(response):
+                serialized = json.dumps(response, ensure_ascii=False)
+                if local is not None:
+                    local.set(path, serialized, options.get('local_ttl'))
+                if not options.get('read_only', read_only()):
+                    if context is not None:
+                        context.pending[path] = serialized
+                    else:
+                        key = b.new_key(key_name=path)
+                        key.set_contents_from_string(serialized)
+
+            response = None
+            if not options.get('write_only', write_only()) and not known_miss and local is not None:
+                cached = local.get(path)
+                if cached is not None:
+                    response = json.loads(cached)
+
             result = None
-            if not per_service_caching().get(service, {}).get('write_only', write_only()):
+            if response is None and not options.get('write_only', write_only()) and not known_miss:
                 result = b.get_key(path)
 
-            if result is None and not per_service_caching().get(service, {}).get('dont_compute', dont_compute()):
+            if response is not None:
+                pass
+            elif result is None and not options.get('dont_compute', dont_compute()):
                 response = getMethod(self, *args, **kw)
 
-                if response['status'] == 200 and not per_service_caching().get(service, {}).get('read_only', read_only()):
-                    key = b.new_key(key_name=path)
-                    key.set_contents_from_string(json.dumps(response, ensure_ascii=False))
-            elif result is None and per_service_caching().get(service, {}).get('dont_compute', dont_compute()):
+                if response['status'] == 200:
+                    store(response)
+            elif result is None and options.get('dont_compute', dont_compute()):
                 return {'status':404, doc_id: {}}
             else:
                 try:
-                    response = json.loads(result.get_contents_as_string())
+                    contents = result.get_contents_as_string()
+                    response = json.loads(contents)
+                    if local is not None:
+                        local.set(path, contents, options.get('local_ttl'))
                 except:
                     response = getMethod(self, *args, **kw)
-                    if response['status'] == 200 and not per_service_caching().get(service, {}).get('read_only', read_only()):
-                        key = b.new_key(key_name=path)
-                        key.set_contents_from_string(json.dumps(response, ensure_ascii=False))
-                    
+                    if response['status'] == 200:
+                        store(response)
+
+            if context is not None:
+                context.responses[path] = response
 
         return response
+    invoke.cached = True
     return invoke
+
+
+def checkout_s3_bucket():
+    '''
+    Takes an idle bucket off the pool, connecting a new one if there are none.
+    boto connections aren't thread-safe, so each fetching thread needs its own.
+    :return: s3 bucket
+    :rtype :class:boto.s3.bucket.Bucket
+    '''
+    try:
+        return S3_BUCKET_POOL.get_nowait()
+    except Queue.Empty:
+        return connect_s3().get_bucket('nlp-data', validate=False)
+
+
+def checkin_s3_bucket(b):
+    '''
+    Returns a bucket to the pool so its keep-alive connection gets reused
+    :param b: a bucket from checkout_s3_bucket
+    '''
+    S3_BUCKET_POOL.put(b)
+
+
+def get_key_contents(b, key_name):
+    '''
+    Reads a key with a single GET
+    :param b: the bucket to read from
+    :param key_name: the name of the key
+    :return: the contents, or None if the key doesn't exist
+    '''
+    key = Key(b)
+    key.key = key_name
+    try:
+        return key.get_contents_as_string()
+    except S3ResponseError as e:
+        if e.status != 404:
+            raise
+        return None
+
+
+def cachedResponses(service_class, doc_ids, method='get', concurrency=S3_CONCURRENCY):
+    ''' Reads the cached responses of a service for many documents at once, so a caller looping
+    over a wiki only has to call the service for the documents that missed.
+    Reads go to the active DocumentContext first, then the in-process tier, then the bucket,
+    with at most concurrency bucket reads in flight. Nothing is computed or written to the bucket.
+    :param service_class: the service, e.g. EntityCountsService
+    :param doc_ids: a list of doc ids
+    :param method: the name of the cached method
+    :param concurrency: the most bucket reads in flight at once
+    :return: a tuple of a dict of doc id to cached response, and a list of the doc ids that missed
+    '''
+    service = str(service_class.__name__)+'.'+method
+    options = per_service_caching().get(service, {})
+    b = bucket()
+    context = document_context()
+    local = local_cache_for_service(service) if b is not None else None
+
+    responses = {}
+    unread = []
+    for doc_id in doc_ids:
+        path = _response_path(doc_id, service)
+        if context is not None and path in context.responses:
+            responses[doc_id] = context.responses[path]
+        elif b is None or options.get('write_only', write_only()):
+            continue
+        else:
+            cached = local.get(path) if local is not None else None
+            if cached is not None:
+                responses[doc_id] = json.loads(cached)
+            else:
+                unread.append((doc_id, path))
+
+    unread_queue = Queue.Queue()
+    for item in unread:
+        unread_queue.put(item)
+    lock = threading.Lock()
+
+    def work():
+        worker_bucket = checkout_s3_bucket()
+        try:
+            while True:
+                try:
+                    doc_id, path = unread_queue.get_nowait()
+                except Queue.Empty:
+                    break
+                try:
+                    try:
+                        contents = get_key_contents(worker_bucket, path)
+                    except socket.error:
+                        # probably need to refresh our connection
+                        worker_bucket = connect_s3().get_bucket('nlp-data', validate=False)
+                        contents = get_key_contents(worker_bucket, path)
+                    if contents is None:
+                        continue
+                    response = json.loads(contents)
+                except Exception:
+                    continue  # treated as a miss, like an unreadable key in cachedServiceRequest
+                if local is not None:
+                    local.set(path, contents, options.get('local_ttl'))
+                with lock:
+                    responses[doc_id] = response
+        finally:
+            checkin_s3_bucket(worker_bucket)
+
+    workers = [threading.Thread(target=work) for i in range(min(concurrency, len(unread)))]
+    for worker in workers:
+        worker.daemon = True
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    if context is not None:
+        for doc_id, response in responses.items():
+            context.responses[_response_path(doc_id, service)] = response
+    return responses, [doc_id for doc_id in doc_ids if doc_id not in responses]
@@ -0,0 +1,66 @@
+import marshal
+import zlib
+
+'''
+Versioned binary serialization of parsed documents, stored in S3 next to the XML.
+A blob is MAGIC, one version byte, then a zlib-compressed marshal of the length of the source XML
+and the corenlp_xml.parse() dict.
+Dict keys and short string values (tags, offsets, ids) are interned before dumping, so marshal
+writes each distinct one once and loads them back as shared objects.
+'''
+
+MAGIC = 'NLPP'
+VERSION = 1
+HEADER = MAGIC + chr(VERSION)
+S3_PREFIX = 'parse_bin'
+
+'''
+Strings at most this long are interned; that covers tags and numbers but not words in the parse.
+'''
+INTERN_MAX_LENGTH = 16
+
+
+def key_name(doc_id):
+    ''' The S3 key for a document's compact parse
+    :param doc_id: the id of the document in Solr
+    '''
+    return '%s/%s/%s.bin' % ((S3_PREFIX,) + tuple(doc_id.split('_')))
+
+
+def _interned(value):
+    ''' Recursively interns dict keys and short strings
+    :param value: a value from a parsed document
+    '''
+    if isinstance(value, dict):
+        return dict([(_interned(key), _interned(item)) for key, item in value.iteritems()])
+    if isinstance(value, list):
+        return [_interned(item) for item in value]
+    if type(value) is str and len(value) <= INTERN_MAX_LENGTH:
+        return intern(value)
+    return value
+
+
+def dumps(parse, source_size=0):
+    ''' Serializes a parsed document
+    :param parse: the dict from corenlp_xml.parse
+    :param source_size: the length of the XML it was parsed from, so caches can budget consistently
+    :return: a string
+    '''
+    return HEADER + zlib.compress(marshal.dumps((source_size, _interned(parse)), 2))
+
+
+def loads(data):
+    ''' Deserializes a parsed document
+    :param data: a string from dumps
+    :return: a tuple of the dict from corenlp_xml.parse and the length of its source XML
+    :raises ValueError: if the blob isn't ours or was written by another version
+    '''
+    if not data.startswith(MAGIC) or len(data) <= len(HEADER):
+        raise ValueError('Not a compact parse')
+    if data[len(MAGIC)] != chr(VERSION):
+        raise ValueError('Compact parse version %d is not %d' % (ord(data[len(MAGIC)]), VERSION))
+    try:
+        source_size, parse = marshal.loads(zlib.decompress(data[len(HEADER):]))
+    except (zlib.error, EOFError, TypeError) as e:
+        raise ValueError('Corrupt compact parse: %s' % e)
+    return parse, source_size
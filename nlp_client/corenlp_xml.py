@@ -0,0 +1,89 @@
+from xml.etree.cElementTree import iterparse
+from cStringIO import StringIO
+from gzip import open as gzopen
+import os
+
+'''
+Streaming reader for Stanford CoreNLP XML output.
+parse() is a drop-in for xmltodict.parse, except repeated elements always come back as lists.
+'''
+
+'''
+(parent, child) pairs of elements that can repeat, so the child is always a list.
+Dependency edges repeat under every flavor of dependencies element.
+'''
+LIST_TAGS = frozenset([('sentences', 'sentence'), ('tokens', 'token'),
+                       ('coreference', 'coreference'), ('coreference', 'mention')])
+
+
+def is_list_tag(parent, tag):
+    ''' Whether an element should always be collected into a list
+    :param parent: the tag of the parent element
+    :param tag: the tag of the element
+    '''
+    return (parent, tag) in LIST_TAGS or (tag == 'dep' and parent is not None and parent.endswith('dependencies'))
+
+
+def parse(xml):
+    ''' Transforms CoreNLP XML into the same nested dict structure as xmltodict,
+    with attributes as '@name', mixed text as '#text', and consistent list types.
+    Each element is cleared once it has been consumed, so the tree never fully materializes.
+    :param xml: the XML as a string
+    :return: a dict
+    '''
+    if isinstance(xml, unicode):
+        xml = xml.encode('utf-8')
+    tags = [None]
+    stack = [{}]
+    for event, elem in iterparse(StringIO(xml), events=('start', 'end')):
+        if event == 'start':
+            tags.append(elem.tag)
+            stack.append(dict([('@' + key, value) for key, value in elem.attrib.items()]))
+            continue
+
+        node = stack.pop()
+        tag = tags.pop()
+        text = elem.text.strip() if elem.text else None
+        if node:
+            if text:
+                node['#text'] = text
+            value = node
+        else:
+            value = text or None
+
+        parent = stack[-1]
+        if is_list_tag(tags[-1], tag):
+            parent.setdefault(tag, []).append(value)
+        elif tag in parent:
+            if not isinstance(parent[tag], list):
+                parent[tag] = [parent[tag]]
+            parent[tag].append(value)
+        else:
+            parent[tag] = value
+        elem.clear()
+    return stack[0]
+
+
+def iter_files(paths):
+    ''' Reads CoreNLP XML files, e.g. for benchmarks over a sample of real parses
+    :param paths: files and directories; directories are searched recursively for .xml and .xml.gz files
+    :return: a generator of each file's XML, in path order
+    '''
+    files = []
+    for p in paths:
+        if os.path.isdir(p):
+            for root, dirs, names in os.walk(p):
+                files += [os.path.join(root, name) for name in names if name.endswith('.xml') or name.endswith('.xml.gz')]
+        else:
+            files.append(p)
+    for f in sorted(files):
+        yield (gzopen(f) if f.endswith('.gz') else open(f)).read()
+
+
+def sentence_parses(doc):
+    ''' Every sentence's bracketed parse, in document order, skipping sentences without one
+    :param doc: a dict from parse
+    :return: a list of strings
+    '''
+    sentences = (doc.get('root', {}).get('document', {}).get('sentences') or {}).get('sentence', [])
+    return [sentence['parse'] for sentence in sentences if sentence.get('parse')]
@@ -0,0 +1,114 @@
+from heapq import heappush, heappop, heapify
+from operator import itemgetter
+from fanout import Reducer
+
+'''
+Streaming counters for wiki-scale frequency counts.
+'''
+
+
+class TopK:
+
+    ''' Approximate heavy hitters in bounded memory, using the Space-Saving algorithm (Metwally et al, 2005).
+    Keeps at most capacity counters; any item seen more than N/capacity times is guaranteed to be kept,
+    and each kept count overestimates the true count by at most its recorded error.
+    '''
+
+    def __init__(self, k, capacity=None):
+        ''' Constructor method
+        :param k: how many items most_common returns by default
+        :param capacity: how many counters to keep; more is more accurate. Defaults to 10k.
+        '''
+        self.k = k
+        self.capacity = capacity or k * 10
+        self.counts = {}
+        self.errors = {}
+        self.heap = []  # one (count, item) entry per item; a count may be stale, but is never too high
+
+    def add(self, item, count=1):
+        ''' Counts an occurrence of an item
+        :param item: a hashable item
+        :param count: how many times it occurred
+        '''
+        if item in self.counts:
+            self.counts[item] += count
+            return
+        error = 0
+        if len(self.counts) >= self.capacity:
+            error = self._evict_min()
+        self.counts[item] = error + count
+        self.errors[item] = error
+        heappush(self.heap, (error + count, item))
+
+    def update(self, items):
+        ''' Counts every item in an iterable
+        :param items: an iterable of hashable items
+        '''
+        for item in items:
+            self.add(item)
+
+    def merge(self, other):
+        ''' Adds another summary's counts, e.g. one built by another worker, then trims back to capacity.
+        An item one summary had already dropped can be undercounted by at most that summary's smallest count.
+        :param other: a TopK
+        '''
+        for item, count in other.counts.items():
+            if item in self.counts:
+                self.counts[item] += count
+                self.errors[item] += other.errors[item]
+            else:
+                self.counts[item] = count
+                self.errors[item] = other.errors[item]
+        ranked = sorted(self.counts.items(), key=itemgetter(1), reverse=True)
+        for item, count in ranked[self.capacity:]:
+            del self.counts[item]
+            del self.errors[item]
+        self.heap = [(count, item) for item, count in self.counts.items()]
+        heapify(self.heap)
+
+    def _evict_min(self):
+        ''' Drops the item with the lowest count
+        :return: its count
+        '''
+        while True:
+            count, item = heappop(self.heap)
+            current = self.counts[item]
+            if current == count:
+                del self.counts[item]
+                del self.errors[item]
+                return count
+            heappush(self.heap, (current, item))
+
+    def most_common(self, n=None):
+        ''' The items with the highest counts
+        :param n: how many to return; defaults to k
+        :return: a list of (item, count) tuples, highest first
+        '''
+        return sorted(self.counts.items(), key=itemgetter(1), reverse=True)[:n or self.k]
+
+
+class TopKReducer(Reducer):
+
+    ''' Streams every document's list of items through a TopK, for fanout.fan_out '''
+
+    def __init__(self, k, capacity=None):
+        ''' Constructor method
+        :param k: how many items to report
+        :param capacity: how many counters each TopK keeps
+        '''
+        self.k = k
+        self.capacity = capacity
+
+    def initial(self):
+        return TopK(self.k, self.capacity)
+
+    def add(self, total, doc_id, value):
+        total.update(value or [])
+        return total
+
+    def merge(self, total, partial):
+        total.merge(partial)
+        return total
+
+    def finish(self, total):
+        return total.most_common()
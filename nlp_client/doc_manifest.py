@@ -0,0 +1,206 @@
+from boto.exception import S3ResponseError
+from aggregates import delta_name, save_if_unchanged, FOLD_ATTEMPTS
+from struct import Struct
+from array import array
+import zlib
+import time
+import sys
+
+'''
+A persisted list of every document id in a wiki, so wiki-level requests don't have to list xml/<wid>/.
+A manifest is a header and the sorted page ids as a zlib-compressed array of 32-bit ints.
+
+Like aggregates, writers never touch the manifest itself. The parser pipeline and the hook server
+drop an idempotent per-document delta under manifest_deltas/, and readers fold pending deltas in
+when they load the manifest. A manifest older than MAX_AGE is rebuilt from a full listing.
+As with aggregates, every delta has a key of its own and saves are conditional, so concurrent
+folds and rebuilds never lose a delta.
+'''
+
+MANIFEST_PREFIX = 'manifests'
+DELTA_PREFIX = 'manifest_deltas'
+
+MAGIC = 'NLPM'
+VERSION = 1
+HEADER = Struct('<4sBxxxdI')  # magic, version, when it was built from a listing, number of ids
+
+'''
+Seconds before a manifest is rebuilt from a full listing, to catch documents written without a delta
+'''
+MAX_AGE = 7 * 24 * 60 * 60
+
+
+def _uint32_array(values=()):
+    ''' An array of unsigned 32-bit ints, whatever this platform calls them '''
+    typecode = 'I' if array('I').itemsize == 4 else 'L'
+    return array(typecode, values)
+
+
+class Manifest:
+
+    ''' The document ids of one wiki '''
+
+    def __init__(self, wiki_id, page_ids=(), built=None, etag=None):
+        ''' Constructor method
+        :param wiki_id: the id of the wiki
+        :param page_ids: an iterable of int page ids
+        :param built: when the ids were last listed from S3, as a unix timestamp
+        :param etag: the etag of the manifest this one was read from or replaces, if there was one
+        '''
+        self.wiki_id = str(wiki_id)
+        self.page_ids = set(page_ids)
+        self.built = time.time() if built is None else built
+        self.etag = etag
+
+    @staticmethod
+    def key_name(wiki_id):
+        ''' Where the manifest lives in S3 '''
+        return '%s/%s.bin' % (MANIFEST_PREFIX, wiki_id)
+
+    @staticmethod
+    def from_doc_ids(wiki_id, doc_ids, replaces=None):
+        ''' Builds a manifest from a listing of doc ids; ids that aren't numeric are skipped
+        :param wiki_id: the id of the wiki
+        :param doc_ids: an iterable of doc ids, e.g. an ArticleDocIdIterator
+        :param replaces: the stale Manifest being rebuilt, if there is one
+        '''
+        page_ids = [page_id_from_doc_id(doc_id) for doc_id in doc_ids]
+        return Manifest(wiki_id, [page_id for page_id in page_ids if page_id is not None],
+                        etag=replaces.etag if replaces is not None else None)
+
+    @staticmethod
+    def loads(wiki_id, data):
+        ''' Deserializes a manifest
+        :raises ValueError: if the blob isn't a manifest, or was written by another version
+        '''
+        if len(data) < HEADER.size:
+            raise ValueError('Not a manifest')
+        magic, version, built, count = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError('Not a manifest')
+        if version != VERSION:
+            raise ValueError('Manifest version %d is not %d' % (version, VERSION))
+        page_ids = _uint32_array()
+        try:
+            page_ids.fromstring(zlib.decompress(data[HEADER.size:]))
+        except zlib.error as e:
+            raise ValueError('Corrupt manifest: %s' % e)
+        if sys.byteorder != 'little':
+            page_ids.byteswap()
+        if len(page_ids) != count:
+            raise ValueError('Corrupt manifest: expected %d ids, found %d' % (count, len(page_ids)))
+        return Manifest(wiki_id, page_ids, built)
+
+    def dumps(self):
+        page_ids = _uint32_array(sorted(self.page_ids))
+        if sys.byteorder != 'little':
+            page_ids.byteswap()
+        return HEADER.pack(MAGIC, VERSION, self.built, len(page_ids)) + zlib.compress(page_ids.tostring())
+
+    @staticmethod
+    def load(bucket, wiki_id):
+        ''' Reads a manifest from S3
+        :param bucket: the nlp-data bucket
+        :param wiki_id: the id of the wiki
+        :return: a Manifest, or None if there isn't a readable one
+        '''
+        key = bucket.get_key(Manifest.key_name(wiki_id))
+        if key is None:
+            return None
+        try:
+            manifest = Manifest.loads(wiki_id, key.get_contents_as_string())
+        except ValueError:
+            return None
+        manifest.etag = key.etag
+        return manifest
+
+    def reload(self, bucket):
+        ''' Replaces the ids with what's in S3 now, e.g. after losing a save to another folder '''
+        loaded = Manifest.load(bucket, self.wiki_id)
+        if loaded is not None:
+            self.page_ids = loaded.page_ids
+            self.built = loaded.built
+            self.etag = loaded.etag
+
+    def save(self, bucket):
+        ''' Writes the manifest to S3, unless it changed there since it was loaded
+        :return: whether it was written
+        '''
+        etag = save_if_unchanged(bucket, Manifest.key_name(self.wiki_id), self.dumps(), self.etag)
+        if etag is None:
+            return False
+        self.etag = etag
+        return True
+
+    def is_fresh(self, max_age=MAX_AGE):
+        return time.time() - self.built < max_age
+
+    def doc_ids(self):
+        ''' The wiki's doc ids, in page id order '''
+        return ['%s_%d' % (self.wiki_id, page_id) for page_id in sorted(self.page_ids)]
+
+    def fold_deltas(self, bucket):
+        ''' Applies and deletes every pending delta for this wiki, oldest first
+        :param bucket: the nlp-data bucket
+        :return: the number of deltas folded in
+        '''
+        for attempt in range(FOLD_ATTEMPTS):
+            keys = sorted(bucket.list(prefix=delta_prefix(self.wiki_id)), key=lambda key: key.name)
+            for key in keys:
+                page_id = page_id_from_doc_id('%s_%s' % (self.wiki_id, key.name.split('/')[-1].split('.')[0]))
+                if page_id is None:
+                    continue
+                try:
+                    deleted = key.get_contents_as_string() == 'deleted'
+                except S3ResponseError:
+                    continue  # someone else folded it first
+                if deleted:
+                    self.page_ids.discard(page_id)
+                else:
+                    self.page_ids.add(page_id)
+            if not keys:
+                return 0
+            if self.save(bucket):
+                bucket.delete_keys([key.name for key in keys])
+                return len(keys)
+            self.reload(bucket)
+        return 0
+
+
+def page_id_from_doc_id(doc_id):
+    ''' The numeric page id of a doc id, or None if it isn't numeric '''
+    try:
+        return int(doc_id.split('_')[1])
+    except (IndexError, ValueError):
+        return None
+
+
+def delta_prefix(wiki_id):
+    return '%s/%s/' % (DELTA_PREFIX, wiki_id)
+
+
+def write_delta(bucket, doc_id, deleted=False):
+    ''' Records that a document was added or deleted
+    :param bucket: the nlp-data bucket
+    :param doc_id: the id of the document
+    :param deleted: whether the document was deleted
+    '''
+    wiki_id, page_id = doc_id.split('_')
+    key = bucket.new_key(key_name=delta_prefix(wiki_id) + delta_name(page_id))
+    key.set_contents_from_string('deleted' if deleted else 'added')
+
+
+def record_document(bucket, doc_id):
+    ''' Records a newly parsed document
+    :param bucket: the nlp-data bucket
+    :param doc_id: the id of the document
+    '''
+    write_delta(bucket, doc_id)
+
+
+def record_deletion(bucket, doc_id):
+    ''' Records a deleted document
+    :param bucket: the nlp-data bucket
+    :param doc_id: the id of the document
+    '''
+    write_delta(bucket, doc_id, deleted=True)
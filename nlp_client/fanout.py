@@ -0,0 +1,181 @@
+from multiprocessing import Pool
+from itertools import imap
+
+'''
+Maps a per-document function over a wiki's documents and reduces the results, optionally
+across a persistent pool of worker processes.
+Documents are dispatched in chunks; each worker reduces its chunk locally and sends back a
+single partial result, which the caller merges as chunks complete. Nothing is shared between
+processes, so there are no Manager proxies and no read-modify-write races.
+Mappers and reducers cross process boundaries, so they must be picklable: module-level
+functions, or instances of module-level classes.
+A mapper with a map_many method, taking a list of doc ids and returning a dict of doc id to
+value, is handed each chunk whole, so it can fetch the chunk's documents in one request.
+'''
+
+CHUNK_SIZE = 50
+
+POOL = None
+POOL_PROCESSES = None
+
+'''
+Functions each worker process runs once when it starts, e.g. to drop inherited connections
+'''
+WORKER_INITIALIZERS = []
+
+
+def on_worker_start(func):
+    ''' Registers a function to run in each new worker process. Only affects pools created afterwards.
+    :param func: a function taking no arguments
+    '''
+    if func not in WORKER_INITIALIZERS:
+        WORKER_INITIALIZERS.append(func)
+
+
+def _initialize_worker():
+    for func in WORKER_INITIALIZERS:
+        func()
+
+
+def pool(processes):
+    ''' Access the persistent worker pool, creating it on first use or when its size changes
+    :param processes: the number of worker processes
+    :return: a multiprocessing.Pool
+    '''
+    global POOL, POOL_PROCESSES
+    if POOL is None or POOL_PROCESSES != processes:
+        close_pool()
+        POOL = Pool(processes=processes, initializer=_initialize_worker)
+        POOL_PROCESSES = processes
+    return POOL
+
+
+def close_pool():
+    ''' Shuts down the persistent worker pool, if there is one '''
+    global POOL, POOL_PROCESSES
+    if POOL is not None:
+        POOL.terminate()
+        POOL.join()
+    POOL = None
+    POOL_PROCESSES = None
+
+
+class Reducer:
+
+    ''' Folds per-document values into a single result.
+    add folds one document into a total; merge folds one chunk's total into another.
+    By default the total is a dict with an entry per document, so a subclass that keeps one
+    entry per document only needs to override add; one that accumulates must override merge too.
+    '''
+
+    def initial(self):
+        ''' A fresh, empty total '''
+        return {}
+
+    def add(self, total, doc_id, value):
+        ''' Folds one document's value into a total
+        :param total: the running total
+        :param doc_id: the id of the document
+        :param value: the mapper's result for the document
+        :return: the new total
+        '''
+        total[doc_id] = value
+        return total
+
+    def merge(self, total, partial):
+        ''' Folds a chunk's total into the running total
+        :param total: the running total
+        :param partial: the total for a chunk of documents
+        :return: the new total
+        '''
+        total.update(partial)
+        return total
+
+    def finish(self, total):
+        ''' Turns the final total into the result '''
+        return total
+
+
+class DocumentValuesReducer(Reducer):
+
+    ''' Collects a dict of doc id to value, using the Reducer defaults '''
+    pass
+
+
+class KeyedValuesReducer(Reducer):
+
+    ''' Collects, for each key of every document's dict, the list of that key's values across documents '''
+
+    def add(self, total, doc_id, value):
+        for key, item in (value or {}).items():
+            total.setdefault(key, []).append(item)
+        return total
+
+    def merge(self, total, partial):
+        for key, items in partial.items():
+            total.setdefault(key, []).extend(items)
+        return total
+
+
+def chunks(items, size):
+    ''' Lazily splits an iterable into consecutive lists
+    :param items: an iterable
+    :param size: the most items in a chunk
+    '''
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _reduce_chunk(task):
+    ''' Runs in a worker: maps and reduces one chunk of documents
+    :param task: a tuple of mapper, reducer, and a list of doc ids
+    :return: a tuple of the number of documents and the chunk's total
+    '''
+    mapper, reducer, doc_ids = task
+    total = reducer.initial()
+    if hasattr(mapper, 'map_many'):
+        values = mapper.map_many(doc_ids)
+        for doc_id in doc_ids:
+            total = reducer.add(total, doc_id, values.get(doc_id))
+    else:
+        for doc_id in doc_ids:
+            total = reducer.add(total, doc_id, mapper(doc_id))
+    return len(doc_ids), total
+
+
+def fan_out(doc_ids, mapper, reducer, processes=None, chunk_size=CHUNK_SIZE, progress=None):
+    ''' Maps a function over documents and reduces the results
+    :param doc_ids: a list of doc ids, or any iterable of them, e.g. an ArticleDocIdIterator still listing
+    :param mapper: a function of doc id to value, optionally with a map_many method
+    :param reducer: a Reducer
+    :param processes: the number of worker processes; None or 1 runs everything in this process
+    :param chunk_size: how many documents to dispatch to a worker at a time
+    :param progress: called with (documents done, total documents) as each chunk completes;
+                     the total is None when doc_ids has no length
+    :return: the reducer's finished result
+    '''
+    total_docs = len(doc_ids) if hasattr(doc_ids, '__len__') else None
+    tasks = ((mapper, reducer, chunk) for chunk in chunks(doc_ids, chunk_size))
+    if processes is not None and processes > 1:
+        results = pool(processes).imap_unordered(_reduce_chunk, tasks)
+    else:
+        results = imap(_reduce_chunk, tasks)
+    done = 0
+    total = reducer.initial()
+    for size, partial in results:
+        total = reducer.merge(total, partial)
+        done += size
+        if progress is not None:
+            progress(done, total_docs)
+    return reducer.finish(total)
+
+
+def print_progress(done, total):
+    ''' A progress callback for scripts '''
+    print '(%d/%s)' % (done, total if total is not None else '?')
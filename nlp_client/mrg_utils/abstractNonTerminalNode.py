@@ -25,33 +25,13 @@ from node import *
 from nonTerminalNode import *
 
 class AbstractNonTerminalNode(Node):
-    def __init__(self, aList, aParent, aSentCount):
-        Node.__init__(self, aList, aParent, aSentCount)
-        self.children = self.populateChildren(aList)
-        self.string = self.getString()
+    __slots__ = ()
+
+    def __init__(self, aLabel, children, aParent, aSentCount):
+        Node.__init__(self, aLabel, aParent, aSentCount)
+        self.children = self.adoptChildren(children)
         self.head = self.getHead()
         self.termHead= self.getTermHead()
-        
-    def getString(self):
-        return ' '.join([i.string for i in self.children])
-        
-    def populateChildren(self, aList):
-        children = []
-        for i in aList:
-            if type(i) == list:
-                if self.terminalCheck(i) == True:
-                    children.append(TerminalNode(i, self, self.index))
-                else:
-                    children.append(NonTerminalNode(i, self, self.index))
-        for i in range(0, len(children)):
-            try:
-                children[i].oneRight = children[i+1]
-            except:
-                pass
-            if i > 0:
-                children[i].oneLeft = children[i-1]
-            children[i].oneUp = self
-        return children
             
             
     def getTermHead(self):
@@ -26,9 +26,12 @@
 from nonTerminalNode import *
 
 class DocNode(NonTerminalNode):
+    __slots__ = ('termhead', 'domNode')
+
     def __init__(self, nodeList):
         self.isTop = True
         self.pos = 'DOC'
+        self.category = 'DOC'
         self.isTerminal = False
         self.isNonTerminal = True
         self.children = nodeList
@@ -48,4 +51,4 @@ class DocNode(NonTerminalNode):
             if i > 0:
                 self.children[i].oneLeft = self.children[i-1]
             self.children[i].oneUp = self
-            
+            
\ No newline at end of file
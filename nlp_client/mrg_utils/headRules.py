@@ -107,109 +107,127 @@ semHeadRules = {\
 }
 
 
+# The rules below are evaluated against a node's children, with each rule's tag list
+# compiled once into a frozenset for membership and a tuple for preference order.
+# A child "is a trace" if its string is one of the traces.
+
+traceSet = frozenset(traces)
+
+
+def _rightIm(children, members, order):     ## Rightmost child, skipping up to two traces
+    if children[-1].isTerminal:
+        if len(children) == 1:
+            return children[-1]
+        return children[-2]
+    return _immediate(children[-1], children[-2:-1], children[-3:-2])
+
+def _leftIm(children, members, order):      ## Leftmost child, skipping up to two traces
+    return _immediate(children[0], children[1:2], children[2:3])
+
+def _immediate(first, second, third):
+    if first.string not in traceSet or not second:
+        return first
+    if second[0].string not in traceSet or not third:
+        return second[0]
+    if third[0].string not in traceSet:
+        return third[0]
+    return None
+
+def _acceptRight(child):                    ## Whether a matching child can head, for RightUn and Right
+    if child.string not in traceSet or child.isTerminal:
+        return True
+    if len(child.children) == 1:
+        return False
+    for grandchild in child.children:
+        if grandchild.string not in traceSet:
+            return True
+    return False
+
+def _acceptLeft(child):                     ## Whether a matching child can head, for Left
+    if child.string.split(' ')[0] not in traceSet:
+        return True
+    if child.isTerminal:
+        return False
+    for grandchild in child.children:
+        if grandchild.string not in traceSet:
+            return True
+    return False
+
+def _rightUn(children, members, order):     ## Rightmost child with any of the tags
+    for child in reversed(children):
+        if child.category in members and _acceptRight(child):
+            return child
+
+def _leftUn(children, members, order):      ## Leftmost child with any of the tags
+    for child in children:
+        if child.category in members:
+            return child
+
+def _right(children, members, order):       ## Rightmost child with the first tag that any child has
+    candidates = [child for child in reversed(children) if child.category in members]
+    if candidates:
+        for tag in order:
+            for child in candidates:
+                if child.category == tag and _acceptRight(child):
+                    return child
+
+def _left(children, members, order):        ## Leftmost child with the first tag that any child has
+    candidates = [child for child in children if child.category in members]
+    if candidates:
+        for tag in order:
+            for child in candidates:
+                if child.category == tag and _acceptLeft(child):
+                    return child
+
+evaluators = {'RightIm':_rightIm, 'LeftIm':_leftIm, 'RightUn':_rightUn, 'LeftUn':_leftUn, 'Left':_left, 'Right':_right}
+
+
+def compileRules(rules):
+    compiled = []
+    for name, aList in rules:
+        order = []
+        for tag in aList:
+            if tag not in order:
+                order.append(tag)
+        compiled.append((evaluators[name], frozenset(aList), tuple(order)))
+    return tuple(compiled)
+
+def applyRules(compiled, aNode):
+    for evaluator, members, order in compiled:
+        head = evaluator(aNode.children, members, order)
+        if head is not None:
+            return head
+    return None
+
+
+## The old (aNode, aList) API, for anything still calling it; each list is compiled once
+compiledLists = {}
+
+def compiledList(name, aList):
+    key = (name, tuple(aList))
+    compiled = compiledLists.get(key)
+    if compiled is None:
+        compiled = compiledLists[key] = compileRules([key])
+    return compiled
+
 def RightIm(aNode, aList):
-    if aNode.children[-1].isTerminal:
-        try:
-            aNode.children[-1].depLink.index
-            return aNode.children[-1]
-        except:
-            if len(aNode.children) == 1:
-                return aNode.children[-1]
-            return aNode.children[-2]
-    try:
-        traces.index(aNode.children[-1].string)
-        try:
-            traces.index(aNode.children[-2].string)
-            try:
-                traces.index(aNode.children[-3].string)
-            except:
-                return aNode.children[-3]
-        except:
-            return aNode.children[-2]
-    except:
-        return aNode.children[-1]
+    return applyRules(compiledList('RightIm', aList), aNode)
 
 def LeftIm(aNode, aList):
-    try:
-        traces.index(aNode.children[0].string)
-        try:
-            traces.index(aNode.children[1].string)
-            try:
-                traces.index(aNode.children[2].string)
-            except:
-                return aNode.children[2]
-        except:
-            return aNode.children[1]
-    except:
-        return aNode.children[0]
-    
+    return applyRules(compiledList('LeftIm', aList), aNode)
+
 def RightUn(aNode, aList):
-    x = [y for y in aNode.children]
-    x.reverse()
-    for z in x:
-        try:
-            aList.index(z.pos.split('-')[0])
-            try:
-                traces.index(z.string)
-                if len(z.children) == 1:
-                    continue
-                if z.isTerminal:
-                    continue
-                for b in [a.string for a in z.children]:
-                    if b not in traces:
-                        return z
-            except:
-                return z
-        except:
-            pass
+    return applyRules(compiledList('RightUn', aList), aNode)
 
 def LeftUn(aNode, aList):
-    for child in aNode.children:
-        try:
-            aList.index(child.pos.split('-')[0])
-            return child
-        except:
-            pass
+    return applyRules(compiledList('LeftUn', aList), aNode)
 
 def Right(aNode, aList):
-    x = [y for y in aNode.children]
-    x.reverse()
-    for pos in aList:
-        for z in x:
-            try:
-                [pos].index(z.pos.split('-')[0])
-                try:
-                    traces.index(z.string)
-                    if len(z.children) == 1:
-                        continue
-                    if z.isTerminal:
-                        continue
-                    for b in [a.string for a in z.children]:
-                        if b not in traces:
-                            return z
-                except:
-                    return z
-            except:
-                pass
+    return applyRules(compiledList('Right', aList), aNode)
 
 def Left(aNode, aList):
-    for pos in aList:
-        for child in aNode.children:
-            try:
-                [pos].index(child.pos.split('-')[0])
-                try:
-                    traces.index(child.string.split(' ')[0])
-                    if child.isTerminal:
-                        continue
-                    for b in [a.string for a in child.children]:
-                        if b not in traces:
-                            return child
-                except:
-                    return child
-            except:
-                pass
+    return applyRules(compiledList('Left', aList), aNode)
 
-                
 
 headRules = {'RightIm':RightIm, 'LeftIm':LeftIm, 'RightUn':RightUn, 'LeftUn':LeftUn, 'Left':Left, 'Right':Right}
 
@@ -234,76 +252,69 @@ vpCop = [('Left', ["VP", "ADJP", "NP", "AHADJP", "WHNP"]), ('LeftIm',[])]
 npCoord = [('LeftUn', ["NN", "NNP", "NNPS", "NNS", "NX", "JJR","$","CD"]), ('LeftIm',[])]
 
 
-def hasAux(node):
-    for child in node.children:
-        try:
-            auxtags.index(child.pos)
-            try:
-                for chi in child.children:
-                    try:
-                        auxiliaries.index(chi.string.lower())
-                        return True
-                    except:
-                        pass
-            except:
-                try:
-                    auxiliaries.index(child.string.lower())
-                    return True
-                except:
-                    pass
-        except:
-            pass
-    return False
+compiledSemHeadRules = dict([(label, compileRules(rules)) for label, rules in semHeadRules.items()])
+compiledAuxCase = compileRules(auxCase)
+compiledSqCop = compileRules(sqCop)
+compiledVpCop = compileRules(vpCop)
+compiledNpCoord = compileRules(npCoord)
 
+copulaSet = frozenset(copulas)
+auxiliarySet = frozenset(auxiliaries)
+auxtagSet = frozenset(auxtags)
 
-def hasCop(node):
+
+def _hasVerb(node, verbs):
     for child in node.children:
-        try:
-            auxtags.index(child.pos)
-            try:
+        if child.pos in auxtagSet:
+            if child.isTerminal:
+                if child.string.lower() in verbs:
+                    return True
+            else:
                 for chi in child.children:
-                    try:
-                        copulas.index(chi.string.lower())
+                    if chi.string.lower() in verbs:
                         return True
-                    except:
-                        pass
-            except:
-                try:
-                    copulas.index(child.string.lower())
-                    return True
-                except:
-                    pass
-        except:
-            pass
     return False
 
+def hasAux(node):
+    return _hasVerb(node, auxiliarySet)
+
+def hasCop(node):
+    return _hasVerb(node, copulaSet)
 
 
 def pickCoordHead(node):
-    global npCoord
-    for tup in npCoord:
-        try:
-           headRules[tup[0]](node, tup[1]).string
-           return headRules[tup[0]](node, tup[1])
-        except:
-            pass
+    return applyRules(compiledNpCoord, node)
 
 
 def isCoord(node):
+    coordinated = False
     for child in node.children:
-        try:
-            ['CC', ','].index(child.pos.split('-')[0])
-            for x in node.children:
-                try:
-                    ["NP", "VP", "SBAR"].index(x.pos.split('-')[0])
-                    return False
-                except:
-                    pass
-            return True
-        except:
-            pass
-    return False
-    
+        if child.category in ('NP', 'VP', 'SBAR'):
+            return False
+        if child.category in ('CC', ','):
+            coordinated = True
+    return coordinated
+
+
+def findHead(node):          ## Syntactic head, based on Collins rules, modified by Marneffe et al (2006)
+    if node.pos == "ROOT":
+        return node.children[0].getHead()
+    if node.pos == "NP":
+        if isCoord(node):
+            return pickCoordHead(node)
+    elif node.pos == "VP" or node.pos == "SQ":
+        head = None
+        if hasAux(node):
+            head = applyRules(compiledAuxCase, node)
+        elif hasCop(node):
+            head = applyRules(compiledVpCop if node.pos == "VP" else compiledSqCop, node)
+        if head is not None:
+            return head
+    head = applyRules(compiledSemHeadRules.get(node.category, ()), node)
+    if head is not None:
+        return head
+    return node.children[0]
+
 def getTermHead(aHead, aParent):
     if aHead.isTerminal:
         aHead.headOf.append(aParent)
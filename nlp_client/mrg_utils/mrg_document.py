@@ -30,6 +30,9 @@ from cuecorp import *
 # of sentences, all heads within the document,   #
 # all terminal heads in the document,            #
 # and all words within the document.             #
+# Iterating over it gives its sentences; use     #
+# iterSentences to stream a file's sentences     #
+# without holding the whole document.            #
 ##################################################
 
 from sentence import *
@@ -37,14 +40,20 @@ from docNode import *
 from nonTerminalNode import *
 
 class MRG_Document:
-    def __init__(self, path):
+    def __init__(self, path, lazy=False):
         #path variable should be absolute path of .mrg file
-        self.sentences = self.get_sentences(path)
+        self.path = path
+        self.sentences = self.get_sentences(path, lazy)
         self.heads = self.getHeads()
         self.allWords = self.getAllWords()
         self.termHeads = self.getTermHeads()
         self.doc = self.getDoc()
 
+    def __iter__(self):
+        return iter(self.sentences)
+
+    def __len__(self):
+        return len(self.sentences)
 
     # Method for getting all terminal node objects available
     # within the document
@@ -93,11 +102,12 @@ class MRG_Document:
     # Return a list of terminal syntactic heads, also useful for ML
     def getTermHeads(self):
         headList = []
+        posSet = set([a.pos for a in self.allWords])   ## once per document, not once per node
         for s in self.sentences:
             try:
                 for node in s.nodes.flat:
                     if node.isTerminal:
-                        if node.pos.split('-')[0] in set([a.pos for a in self.allWords]):
+                        if node.pos.split('-')[0] in posSet:
                             if node.oneUp.head == node:
                                 headList.append(node)
             except:
@@ -106,13 +116,18 @@ class MRG_Document:
 
 
     # Create sentence object for each .mrg-style parse
-    def get_sentences(self, path):
+    def get_sentences(self, path, lazy=False):
+        return list(iterSentences(path, lazy))
+
+
+# Yields a sentence object for each .mrg-style parse in a file, reading
+# it a line at a time, so only the current sentence is held in memory
+def iterSentences(path, lazy=False):
+    f = open(path)
+    try:
         counter = 0
-        lines = open(path).readlines()
-        sent_list = '!!('.join(''.join(lines).split('\n(')).split('!!')
-        sentences = []
-        for s in sent_list:
-            if s != '':
-                sentences.append(Sentence(s, counter))
-                counter += 1
-        return sentences
\ No newline at end of file
+        for tree in parse_file(f):
+            yield Sentence(tree, counter, lazy)
+            counter += 1
+    finally:
+        f.close()
\ No newline at end of file
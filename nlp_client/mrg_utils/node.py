@@ -25,31 +25,92 @@
 #Abstract class for syntactic nodes##
 #####################################
 
+# Nodes are slotted: a sentence has one per constituent, so a per-node __dict__
+# is most of its memory. Children are built first and handed to their parent.
+# Anything in LAZY_ATTRIBUTES that hasn't been set yet is worked out by its
+# method the first time it is asked for, then kept in its slot. A node's string
+# is always left until then; in a lazy sentence so are heads, terminal heads,
+# Gorn addresses and even children, so only the nodes something asks about
+# are ever built.
+
 from headRules import *
 
-class Node:
-    def __init__(self, aList, aParent, aSentCount):
+LAZY_ATTRIBUTES = {'string': 'getString', 'head': 'getHead', 'termHead': 'getTermHead', 'gorn': 'getGorn',
+                   'children': 'getChildren', 'flat': 'getFlat', 'flat2': 'getFlat2'}
+
+def terminalCheck(listNode):
+    for item in listNode[1:]:
+        if type(item) == list:
+            return False
+    return True
+
+def listString(aList):           ## A node's string, straight from its nested lists
+    strings = []
+    for item in aList:
+        if type(item) == list:
+            if terminalCheck(item):
+                strings.append(''.join(item[1:]))
+            else:
+                strings.append(listString(item))
+    return ' '.join(strings)
+
+class Node(object):
+    __slots__ = ('label', 'pos', 'category', 'children', 'isTerminal', 'isNonTerminal', 'oneUp', 'oneRight', 'oneLeft',
+                 'isDominated', 'isTop', 'index', 'gorn', 'head', 'termHead', 'string', '_list')
+
+    def __init__(self, aLabel, aParent, aSentCount):
         if self.__class__ == Node:
             raise NotImplementedError, 'class Node is abstract'
-        self.children = None ## List of children
         self.isTerminal = False
         self.isNonTerminal = True
         self.oneUp = None
         self.oneRight = None
         self.oneLeft = None
-        self.listForm = aList
-        self.string = None
+        self.label = aLabel
+        self._list = None
         if not aParent:
             self.isDominated = False
         else:
             self.oneUp = aParent
             self.isDominated = True
-        self.pos = self.listForm[0].split('=')[0].split('|')[0]
+        self.pos = aLabel.split('=')[0].split('|')[0]
+        self.category = self.pos.split('-')[0]  ## What the head rules match on
         self.isTop = False  ## Is root node
         self.index = aSentCount
-        self.gorn = []
 
-        
+    def __getattr__(self, name):
+        compute = LAZY_ATTRIBUTES.get(name)
+        if compute is None:
+            raise AttributeError(name)
+        value = getattr(self, compute)()
+        setattr(self, name, value)
+        return value
+
+    def getString(self):
+        if self._list is not None:
+            return listString(self._list)
+        return ' '.join([i.string for i in self.children])
+
+    def getGorn(self):           ## Gorn address: the sentence number, then the index of each node on the way down
+        return self.oneUp.gorn + [self.oneUp.children.index(self)]
+
+    def getListForm(self):       ## The node as the nested lists sexpr_parse would have given
+        if self._list is not None:
+            return self._list
+        return [self.label] + [child.listForm for child in self.children]
+
+    listForm = property(getListForm)
+
+    def adoptChildren(self, children):
+        for i in range(0, len(children)):
+            if i + 1 < len(children):
+                children[i].oneRight = children[i+1]
+            if i > 0:
+                children[i].oneLeft = children[i-1]
+            children[i].oneUp = self
+            children[i].isDominated = True
+        return children
+
     def hasNode(self, target):   ## Test whether Node dominates target
         f = False
         if self.children:
@@ -62,44 +123,4 @@ class Node:
             return False
 
     def getHead(self):           ## Get syntactic head, based on Collins rules, modified by Marneffe et al (2006)
-        if self.pos == "ROOT":
-            return self.children[0].getHead()
-        if self.pos == "NP":
-            if isCoord(self):
-                return pickCoordHead(self)
-        elif self.pos == "VP":
-            if hasAux(self):
-                for case in auxCase:
-                    if headRules[case[0]](self, case[1]) != None:
-                        return headRules[case[0]](self, case[1])
-            elif hasCop(self):
-                for case in vpCop:
-                    if headRules[case[0]](self, case[1]) != None:
-                        return headRules[case[0]](self, case[1])
-        elif self.pos == "SQ":
-            if hasAux(self):
-                for case in auxCase:
-                    if headRules[case[0]](self, case[1]) != None:
-                        return headRules[case[0]](self, case[1])
-            elif hasCop(self):
-                for case in sqCop:
-                    if headRules[case[0]](self, case[1]) != None:
-                        return headRules[case[0]](self, case[1])
-        for tup in semHeadRules.get(self.pos.split('-')[0], []):
-            if headRules[tup[0]](self, tup[1]) != None:
-                return headRules[tup[0]](self, tup[1])
-        return self.children[0]     
-        
-
-    def terminalCheck(self, listNode):
-        for item in listNode[1:]:
-            if type(item) == list:
-                return False            
-        return True
-
-
-
-
-
-
-            
+        return findHead(self)
@@ -25,38 +25,33 @@ from node import *
 from terminalNode import * 
 
 class NonTerminalNode(Node):
-    def __init__(self, aList, aParent, aSentCount):
-        Node.__init__(self, aList, aParent, aSentCount)
-        self.children = self.populateChildren(aList)
-        self.string = self.getString()
-        self.head = self.getHead()
-        self.termHead= self.getTermHead()
-        
-    def getString(self):
-        return ' '.join([i.string for i in self.children])
-        
-    def populateChildren(self, aList):
+    __slots__ = ()
+
+    # Given aList instead of children, the node is lazy: it keeps its nested lists,
+    # and builds its children and finds its head only when they're asked for.
+    def __init__(self, aLabel, children, aParent, aSentCount, aList=None):
+        Node.__init__(self, aLabel, aParent, aSentCount)
+        if aList is not None:
+            self._list = aList
+        else:
+            self.children = self.adoptChildren(children)
+            self.head = self.getHead()
+            self.termHead= self.getTermHead()
+
+    def getChildren(self):
         children = []
-        for i in aList:
+        for i in self._list:
             if type(i) == list:
-                if self.terminalCheck(i) == True:
-                    children.append(TerminalNode(i, self, self.index))
+                if terminalCheck(i):
+                    children.append(TerminalNode(i[0], i[1:], self, self.index))
                 else:
-                    children.append(NonTerminalNode(i, self, self.index))
-        for i in range(0, len(children)):
-            try:
-                children[i].oneRight = children[i+1]
-            except:
-                pass
-            if i > 0:
-                children[i].oneLeft = children[i-1]
-            children[i].oneUp = self
-        return children
+                    children.append(NonTerminalNode(i[0], None, self, self.index, i))
+        return self.adoptChildren(children)
             
             
     def getTermHead(self):
         if self.head.isTerminal:
-            self.head.headOf.append(self)
+            self.head._headOf.append(self)
             return self.head
         else:
             return self.head.termHead
\ No newline at end of file
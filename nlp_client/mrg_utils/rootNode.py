@@ -24,60 +24,37 @@ from node import *
 from nonTerminalNode import *
 
 class RootNode(NonTerminalNode):
-    def __init__(self, aList, aParent, aSentCount):
-        if len(aList) == 1:
-            NonTerminalNode.__init__(self, aList[0], aParent, aSentCount)
-        else:
-            NonTerminalNode.__init__(self, aList, aParent, aSentCount)
-        gorncount = 0
-        self.children = self.populateChildren(self.listForm)
+    __slots__ = ('flat', 'flat2')
+
+    def __init__(self, aLabel, children, aParent, aSentCount, aList=None):
+        NonTerminalNode.__init__(self, aLabel, children, aParent, aSentCount, aList)
         self.gorn = [aSentCount]
         self.oneUp = None
         self.oneRight = None
         self.oneLeft = None
-        self.flat = self.getFlat()   #Flat representation with traces
-        self.flat2 = self.getFlat2() #Flat representation without traces
-        self.valuateGorns(self.children)  #Create Gorn addresses, a useful way of locating nodes within a tree
+        if aList is None:
+            self.flat = self.getFlat()   #Flat representation with traces
+            self.flat2 = self.getFlat2() #Flat representation without traces
+            self.valuateGorns(self.children)  #Create Gorn addresses, a useful way of locating nodes within a tree
         
     def getFlat(self):
-        def recurse_get(node):
-            li = []
-            for child in node.children:
-                try:
-                    child.children[0]
-                    li.extend(recurse_get(child))
-                except:
-                    li.append(child)
-            return li
-            
-        lis = []
-        for child in self.children:
-            try:
-                child.children[0]
-                lis.extend(recurse_get(child))
-            except:
-                lis.append(child)
-        return lis
+        li = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node.children:
+                stack.extend(reversed(node.children))
+            else:
+                li.append(node)
+        return li
 
 
     def getFlat2(self):
-        x = [n for n in self.flat]
-        y = []
-        for n in x:
-            try:
-                ['-NONE-', '*T*-1', '*T*-2', '*T*', '*', '*-1', '*-2', '*?*'].index(n.pos)
-            except:
-                try:
-                    y.children[0]
-                except:
-                    y.append(n)
-        return y
+        return [n for n in self.flat if n.pos not in ['-NONE-', '*T*-1', '*T*-2', '*T*', '*', '*-1', '*-2', '*?*']]
         
         
     def valuateGorns(self, ls):
         for i in range(0, len(ls)):
             ls[i].gorn = ls[i].oneUp.gorn + [i]
-            try:
-                valuateGorns(ls[i].children)
-            except:
-                pass
\ No newline at end of file
+            if ls[i].children:
+                self.valuateGorns(ls[i].children)
\ No newline at end of file
@@ -26,17 +26,98 @@ from rootNode import *
 from sexpr_parse import *
 
 class Sentence:
-    def __init__(self, strng, counter=0):
-        self.fullTree = parse_string(strng).next()
+    # A lazy sentence starts with just its root node, and builds the rest of the tree,
+    # heads, terminal heads, flat, flat2 and Gorn addresses only as they're asked for.
+    # getTermHead then only builds the nodes the head rules look at on the way down.
+    # strng can also be a parse already read into nested lists, e.g. by sexpr_parse.parse_file.
+    def __init__(self, strng, counter=0, lazy=False):
+        self.lazy = lazy
+        if type(strng) == list:
+            self.parse = None
+            self.tree = strng
+        else:
+            self.parse = strng
+            self.tree = None
         #try:
-        self.nodes = RootNode(self.fullTree, self, counter)
+        if lazy:
+            self.nodes = self.buildLazyTree(self.fullTree, counter)
+        elif self.tree is not None:
+            self.nodes = self.buildTree(tree_tokens(self.tree), counter)
+        else:
+            self.nodes = self.buildTree(tokenize(strng), counter)
         #except:
         #    print 'There was an error processing sentence %d.' % counter
         #    sys.exit()
         self.children = self.nodes.children
+
+    def getFullTree(self):       ## The parse as nested lists
+        if self.tree is not None:
+            return self.tree
+        return parse_string(self.parse).next()
+
+    fullTree = property(getFullTree)
+
+    def buildTree(self, tokens, counter):
+        # Builds nodes straight from the tokens of the first parse in them, children
+        # before parents, without going through nested lists. A frame is the label,
+        # words and child nodes of an open parenthesis; its label is False if it
+        # opened with a list, as the outer list of a PTB-style ((S ...)) does.
+        stack = []
+        frame = None
+        root = None
+        last = len(tokens) - 1
+        for i in xrange(len(tokens)):
+            token = tokens[i]
+            if token == '(':
+                if frame is not None:
+                    if frame[0] is None:
+                        frame[0] = False
+                    stack.append(frame)
+                frame = [None, [], []]
+
+            elif token == ')':
+                if frame is None:
+                    raise IndexError('unbalanced parenthesis')
+                label, words, children = frame
+                frame = stack.pop() if stack else None
+                if frame is None:
+                    if root is None:
+                        root = RootNode(label, children, self, counter)
+                    return root
+                elif not stack and frame[0] is False and not frame[1] and not frame[2] and i < last and tokens[i+1] == ')':
+                    # the only thing in the outer list is the root
+                    root = RootNode(label, children, self, counter)
+                elif children:
+                    frame[2].append(NonTerminalNode(label, children, None, counter))
+                else:
+                    frame[2].append(TerminalNode(label, words, None, counter))
+
+            elif frame is None:
+                raise IndexError('atom outside of a parse')
+
+            elif frame[0] is None:
+                frame[0] = token
+
+            else:
+                frame[1].append(token)
+
+        if frame is not None:
+            raise AssertionError('unbalanced parenthesis')
+        raise StopIteration
         
         
         
+    def buildLazyTree(self, fullTree, counter):
+        tree = fullTree
+        if len(tree) == 1:
+            tree = tree[0]
+        if type(tree) != list or not tree or type(tree[0]) == list:
+            return self.buildTree(tree_tokens(fullTree), counter)  # not a tree; fail the way an eager build does
+        return RootNode(tree[0], None, self, counter, tree)
+
+    def getTermHead(self):       ## The terminal head of the whole sentence
+        return self.nodes.termHead
+
     def getHeads(self):
         def recurse_get(node):
             li = [node.head]
@@ -13,105 +13,64 @@
 # No guarantees
 #
 # Last modified Fri Aug 29 13:57:25 EDT 2003
-
-import sys
+#
+# Tokenizing is now done by padding parentheses with spaces and letting split()
+# find the atoms, rather than character by character, and parse_file and
+# parse_string share one stack builder. tree_tokens turns a parsed list back
+# into its tokens.
 
 ###############################################################################
 
-def _gen_tokens(file):
-  for line in file:
-    line_len = len(line)
-    left = 0
-
-    while left < line_len:
-      c = line[left]
-
-      if c.isspace():
-        left += 1
-      elif c in '()':
-        yield c
-        left += 1
-
-      else:
-        right = left + 1
-        while right < line_len:
-          c = line[right]
-          if c.isspace() or c in '()':
-            break
-
-          right += 1
+def tokenize(line):
+  # split() breaks on exactly the characters isspace() accepts, for str and
+  # unicode alike, so atoms come out as they did from the character scanner
+  return line.replace('(', ' ( ').replace(')', ' ) ').split()
 
-        token = line[left:right]
-        #if token.isdigit():
-        #  token = int(token)
-        yield token
 
-        left = right
+def _gen_tokens(file):
+  for line in file:
+    for token in tokenize(line):
+      yield token
 
 
-def parse_file(file):
+def _build(tokens):
   stack = []
-  for token in _gen_tokens(file):
+  push = stack.append
+  pop = stack.pop
+  for token in tokens:
     if token == '(':
-      stack.append([])
+      push([])
 
     elif token == ')':
-      top = stack.pop()
-      if len(stack) == 0:
-        yield top
-      else:
+      top = pop()
+      if stack:
         stack[-1].append(top)
+      else:
+        yield top
 
     else:
       stack[-1].append(token)
 
   assert len(stack) == 0
 
-def _gen_tokens_from_string(line):
-  line_len = len(line)
-  left = 0
-
-  while left < line_len:
-    c = line[left]
 
-    if c.isspace():
-      left += 1
-    elif c in '()':
-      yield c
-      left += 1
-
-    else:
-      right = left + 1
-      while right < line_len:
-        c = line[right]
-        if c.isspace() or c in '()':
-          break
-
-        right += 1
-
-      token = line[left:right]
-      #if token.isdigit():
-      #  token = int(token)
-      yield token
+def parse_file(file):
+  return _build(_gen_tokens(file))
 
-      left = right
 
 def parse_string(line):
-  stack = []
-  for token in _gen_tokens_from_string(line):
-    if token == '(':
-      stack.append([])
+  return _build(tokenize(line))
 
-    elif token == ')':
-      top = stack.pop()
-      if len(stack) == 0:
-        yield top
-      else:
-        stack[-1].append(top)
 
+def tree_tokens(tree, tokens=None):
+  # the tokens of an already parsed list, as tokenize would have given them
+  if tokens is None:
+    tokens = []
+  tokens.append('(')
+  for item in tree:
+    if type(item) == list:
+      tree_tokens(item, tokens)
     else:
-      stack[-1].append(token)
-
-  assert len(stack) == 0
-
-
+      tokens.append(item)
+  tokens.append(')')
+  return tokens
@@ -23,22 +23,31 @@
 from node import *
 
 class TerminalNode(Node):
-    def __init__(self, aList, aParent, aSentCount):
-        Node.__init__(self, aList, aParent, aSentCount)
+    __slots__ = ('words', '_headOf')
+
+    def __init__(self, aLabel, words, aParent, aSentCount):
+        Node.__init__(self, aLabel, aParent, aSentCount)
+        self.children = None
         self.isTerminal = True
         self.isNonTerminal = False
         self.head = self
         self.termHead = self
+        self.words = words
         self.string = self.getString()
-        self.headOf = []
+        self._headOf = []
         
         
+    def _getHeadOf(self):        ## The nodes this is the immediate head of
+        if self.oneUp is not None and self.oneUp.isNonTerminal:
+            self.oneUp.termHead  # a lazily built parent only adds itself once it knows its head
+        return self._headOf
+
+    headOf = property(_getHeadOf)
+
     def getString(self):
-        string = ''
-        for i in self.listForm[1:]:
-            if type(i) == list:
-                string += self.getString(i)
-                string += ' '
-            else:
-                string += i
-        return string
\ No newline at end of file
+        return ''.join(self.words)
+
+    def getListForm(self):
+        return [self.label] + self.words
+
+    listForm = property(getListForm)
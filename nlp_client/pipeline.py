@@ -0,0 +1,81 @@
+from caching import DocumentContext
+import services
+import traceback
+
+'''
+Runs a set of document-scoped services against one document, loading its parse once.
+Services are ordered so their dependencies run first; inside a DocumentContext, the nested
+service calls each service makes are answered from memory, and cache writes go out in one batch.
+'''
+
+'''
+Document services each service calls internally. Services not listed have no document dependencies.
+'''
+DEPENDENCIES = {
+    'WpEntitiesService': ['AllNounPhrasesService'],
+    'EntitiesService': ['AllNounPhrasesService'],
+    'EntityCountsService': ['EntitiesService', 'CoreferenceCountsService'],
+    'WpEntityCountsService': ['WpEntitiesService', 'CoreferenceCountsService'],
+    'DocumentSentimentService': ['CoreferenceCountsService'],
+    'DocumentEntitySentimentService': ['DocumentSentimentService', 'EntitiesService'],
+    'WpDocumentEntitySentimentService': ['DocumentSentimentService', 'WpEntitiesService'],
+}
+
+
+def resolve(service_names, dependencies=DEPENDENCIES):
+    ''' Orders services so that every service comes after the services it depends on.
+    Dependencies that weren't asked for are pulled in, since they'd be computed anyway.
+    :param service_names: a list of service class names
+    :param dependencies: a dict of service name to the names it depends on
+    :return: a list of service names
+    :raises ValueError: if the dependencies are cyclic
+    '''
+    ordered = []
+    visiting = set()
+
+    def visit(name):
+        if name in ordered:
+            return
+        if name in visiting:
+            raise ValueError('Dependency cycle at %s' % name)
+        visiting.add(name)
+        for dependency in dependencies.get(name, []):
+            visit(dependency)
+        visiting.remove(name)
+        ordered.append(name)
+
+    for name in service_names:
+        visit(name)
+    return ordered
+
+
+class DocumentPipeline:
+
+    ''' Computes a fixed set of document services for one document at a time '''
+
+    def __init__(self, service_names, dependencies=DEPENDENCIES):
+        ''' Constructor method
+        :param service_names: service class names from nlp_client.services
+        :param dependencies: a dict of service name to the names it depends on
+        '''
+        self.service_names = resolve(service_names, dependencies)
+        self.service_classes = [getattr(services, name) for name in self.service_names]
+
+    def run(self, doc_id):
+        ''' Loads the parse once, then computes every service in dependency order
+        :param doc_id: the id of the document
+        :return: a dict of service name to response
+        '''
+        responses = {}
+        with DocumentContext():
+            parse_response = services.ParsedJsonService().get(doc_id)
+            if parse_response['status'] != 200:
+                return dict([(name, parse_response) for name in self.service_names])
+            for name, service_class in zip(self.service_names, self.service_classes):
+                try:
+                    responses[name] = service_class().get(doc_id)
+                except KeyboardInterrupt:
+                    raise
+                except Exception as e:
+                    responses[name] = {'status': 500, 'message': str(e), 'traceback': traceback.format_exc()}
+        return responses
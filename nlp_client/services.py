@@ -2,18 +2,28 @@ from flask.ext import restful
 from text.blob import TextBlob
 from os import path, listdir
 from gzip import open as gzopen
-from caching import cachedServiceRequest, write_only
+from caching import cachedServiceRequest, cachedResponses, documentScopedRequest, write_only, parse_cache, reset_after_fork
+from caching import S3_CONCURRENCY, checkout_s3_bucket, checkin_s3_bucket, get_key_contents
 from mrg_utils import Sentence as MrgSentence
 from boto import connect_s3
 from boto.s3.key import Key
-from multiprocessing import Pool, Manager
+from boto.exception import S3ResponseError
+from itertools import islice
+import threading
+import Queue
 import socket
 import time
 import title_confirmation
+import corenlp_xml
+import compact_parse
+import aggregates
+import doc_manifest
+import counting
+import fanout
+import solr
+import heapq
 import re
 import nltk
-import xmltodict
-import requests
 import types
 import json
 import sys
@@ -31,6 +41,44 @@ def use_multiprocessing(num_cores=4):
     global USE_MULTIPROCESSING, MP_NUM_CORES
     USE_MULTIPROCESSING = True
     MP_NUM_CORES  = num_cores
+
+
+FAN_OUT_PROGRESS = None
+
+def on_fan_out_progress(callback=None):
+    ''' Sets a function to call with (documents done, total documents) while wiki services fan out,
+    e.g. fanout.print_progress
+    '''
+    global FAN_OUT_PROGRESS
+    FAN_OUT_PROGRESS = callback
+
+
+def fan_out(doc_ids, mapper, reducer):
+    '''
+    Maps a function over a wiki's documents and reduces the results, across the persistent
+    worker pool when multiprocessing is on. See fanout.fan_out.
+    :param doc_ids: a list of doc ids
+    :param mapper: a picklable function of doc id to value, e.g. a NestedGet
+    :param reducer: a fanout.Reducer
+    '''
+    return fanout.fan_out(doc_ids, mapper, reducer,
+                          processes=MP_NUM_CORES if USE_MULTIPROCESSING else None,
+                          progress=FAN_OUT_PROGRESS)
+
+
+TOP_HEADS_LIMIT = None
+TOP_HEADS_CAPACITY = None
+
+def use_top_heads_limit(limit=100, capacity=None):
+    ''' Answers TopHeadsService with only the top heads, in bounded memory.
+    Wikis whose heads aren't aggregated yet are streamed through a counting.TopK instead of
+    building the full aggregate, so their counts are approximate.
+    :param limit: how many heads TopHeadsService returns
+    :param capacity: how many counters to keep while streaming; defaults to 10x the limit
+    '''
+    global TOP_HEADS_LIMIT, TOP_HEADS_CAPACITY
+    TOP_HEADS_LIMIT = limit
+    TOP_HEADS_CAPACITY = capacity
     
 
 S3_BUCKET = None
@@ -47,13 +95,98 @@ def get_s3_bucket():
     return S3_BUCKET
 
 
-XML_PATH = '/data/xml/'
+def reset_s3_connections():
+    '''
+    Drops S3 connections inherited from a parent process, including the pool of
+    bucket connections shared with caching; run in each fan-out worker
+    '''
+    global S3_BUCKET
+    S3_BUCKET = None
+    reset_after_fork()
+
+fanout.on_worker_start(reset_s3_connections)
+fanout.on_worker_start(solr.reset_client)
+
 
-# TODO: use load balancer, not a partiucular query slave
-SOLR_URL = 'http://search-s10:8983'
+def get_many_from_s3(doc_ids, fetch, concurrency=S3_CONCURRENCY):
+    '''
+    Runs a per-document S3 fetch over pooled connections with bounded concurrency,
+    yielding (doc_id, response) tuples in completion order
+    :param doc_ids: an iterable of doc ids; consumed lazily
+    :param fetch: a function taking a bucket and a doc id and returning a response
+    :param concurrency: the most fetches in flight at once
+    '''
+    doc_ids = iter(doc_ids)
+    doc_ids_lock = threading.Lock()
+    results = Queue.Queue(maxsize=concurrency * 2)
+    stopped = threading.Event()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return
+            except Queue.Full:
+                pass
+
+    def work():
+        bucket = checkout_s3_bucket()
+        try:
+            while not stopped.is_set():
+                with doc_ids_lock:
+                    doc_id = next(doc_ids, None)
+                if doc_id is None:
+                    break
+                try:
+                    try:
+                        response = fetch(bucket, doc_id)
+                    except socket.error:
+                        # probably need to refresh our connection
+                        bucket = connect_s3().get_bucket('nlp-data', validate=False)
+                        response = fetch(bucket, doc_id)
+                except Exception as e:
+                    response = {'status': 500, 'message': str(e)}
+                put((doc_id, response))
+        finally:
+            checkin_s3_bucket(bucket)
+            put(None)
+
+    workers = [threading.Thread(target=work) for i in range(concurrency)]
+    for worker in workers:
+        worker.daemon = True
+        worker.start()
+
+    try:
+        finished = 0
+        while finished < len(workers):
+            item = results.get()
+            if item is None:
+                finished += 1
+            else:
+                yield item
+    finally:
+        stopped.set()
+
+
+READ_COMPACT_PARSES = True
+WRITE_COMPACT_PARSES = True
+
+def use_compact_parses(read=True, write=True):
+    '''
+    Controls whether ParsedJsonService reads and backfills compact parses under parse_bin/
+    :param read: whether to look for a compact parse before the XML
+    :param write: whether to store a compact parse after parsing XML
+    '''
+    global READ_COMPACT_PARSES, WRITE_COMPACT_PARSES
+    READ_COMPACT_PARSES = read
+    WRITE_COMPACT_PARSES = write
+
+
+XML_PATH = '/data/xml/'
 
 MEMOIZED_WIKIS = {}
-MEMOIZED_JSON = {}
+
+PARSE_TOKENS = re.compile(r'\(|\)|[^\s()]+')
 
 class RestfulResource(restful.Resource):
     
@@ -68,6 +201,37 @@ class RestfulResource(restful.Resource):
 
 
 
+class NestedGet:
+
+    ''' A picklable stand-in for service_class().nestedGet, so it can be fanned out across processes.
+    Fanned out over a cached service, each chunk's cached responses are read in one concurrent batch.
+    '''
+
+    def __init__(self, service_class, backoff=None):
+        ''' Constructor method
+        :param service_class: a document service
+        :param backoff: default value
+        '''
+        self.service_class = service_class
+        self.backoff = backoff
+
+    def __call__(self, doc_id):
+        return self.service_class().nestedGet(doc_id, self.backoff)
+
+    def map_many(self, doc_ids):
+        ''' Reads the cached responses for many documents at once and only computes the misses,
+        without looking them up in the cache again
+        :param doc_ids: a list of doc ids
+        :return: a dict of doc id to value
+        '''
+        if not getattr(self.service_class.get, 'cached', False):
+            return dict([(doc_id, self(doc_id)) for doc_id in doc_ids])
+        responses, misses = cachedResponses(self.service_class, doc_ids)
+        for doc_id in misses:
+            responses[doc_id] = self.service_class().get(doc_id, known_miss=True)
+        return dict([(doc_id, response.get(doc_id, self.backoff)) for doc_id, response in responses.items()])
+
+
 class ParsedXmlService(RestfulResource):
 
     ''' Read-only service responsible for accessing XML from FS '''
@@ -83,15 +247,7 @@ class ParsedXmlService(RestfulResource):
         :param doc_id: the id of the document in Solr
         '''
         try:
-            bucket = get_s3_bucket()
-            key = Key(bucket)
-            key.key = 'xml/%s/%s.xml' % tuple(doc_id.split('_'))
-
-            if key.exists():
-                response = {'status': 200, doc_id:key.get_contents_as_string()}
-            else:
-                response = {'status': 500, 'message': 'Key does not exist'}
-            return response
+            return self.fetch_from_bucket(get_s3_bucket(), doc_id)
         except socket.error:
             # probably need to refresh our connection
             global S3_BUCKET
@@ -99,6 +255,27 @@ class ParsedXmlService(RestfulResource):
             return self.get_from_s3(doc_id)
 
 
+    def get_many(self, doc_ids, concurrency=S3_CONCURRENCY):
+        ''' Fetches XML for many documents over pooled S3 connections, yielding each as it arrives.
+        Responses come back in completion order, not the order of doc_ids.
+        :param doc_ids: an iterable of doc ids; consumed lazily
+        :param concurrency: the most GETs in flight at once
+        :return: a generator of (doc_id, response) tuples
+        '''
+        return get_many_from_s3(doc_ids, self.fetch_from_bucket, concurrency)
+
+
+    def fetch_from_bucket(self, bucket, doc_id):
+        ''' Issues a single GET for a document's XML; a 404 stands in for the old HEAD request
+        :param bucket: the bucket to read from
+        :param doc_id: the id of the document in Solr
+        '''
+        contents = get_key_contents(bucket, 'xml/%s/%s.xml' % tuple(doc_id.split('_')))
+        if contents is None:
+            return {'status': 500, 'message': 'Key does not exist'}
+        return {'status': 200, doc_id: contents}
+
+
     def get_from_file(self, doc_id):
         ''' Return a response with the XML of the parsed text 
         :param doc_id: the id of the document in Solr
@@ -123,29 +300,101 @@ class ParsedXmlService(RestfulResource):
 class ParsedJsonService(RestfulResource):
 
     ''' Read-only service responsible for accessing XML and transforming it to JSON
-    Uses the ParsedXmlService
+    Prefers the compact parse under parse_bin/ and falls back to the ParsedXmlService
     '''
     def get(self, doc_id):
         ''' Returns document parse as JSON 
         :param doc_id: the id of the document in Solr
         '''
 
-        global MEMOIZED_JSON
+        cache = parse_cache()
+        response = cache.get(doc_id)
 
-        response = MEMOIZED_JSON.get(doc_id, {})
-
-        if len(response) == 0:
+        if response is None:
             try:
-                xmlResponse = ParsedXmlService().get(doc_id)
-                if xmlResponse['status'] != 200:
-                    return xmlResponse
-                MEMOIZED_JSON[doc_id] = {'status':200, doc_id: xmltodict.parse(xmlResponse[doc_id])}
-                response = MEMOIZED_JSON[doc_id]
+                try:
+                    raw = self.fetch_from_bucket(get_s3_bucket(), doc_id)
+                except socket.error:
+                    # probably need to refresh our connection
+                    global S3_BUCKET
+                    S3_BUCKET = None
+                    raw = self.fetch_from_bucket(get_s3_bucket(), doc_id)
+                response = self.load(doc_id, raw)
             except Exception as e:
                 return {'status': 500, 'message': str(e)}
         return response
 
 
+    def get_many(self, doc_ids, concurrency=S3_CONCURRENCY):
+        ''' Yields parses for many documents, parsing each one while the rest are still downloading.
+        Memoized parses come first; the remainder arrive in completion order.
+        :param doc_ids: an iterable of doc ids
+        :param concurrency: the most S3 GETs in flight at once
+        :return: a generator of (doc_id, response) tuples
+        '''
+        cache = parse_cache()
+        missing = []
+        for doc_id in doc_ids:
+            response = cache.get(doc_id)
+            if response is None:
+                missing.append(doc_id)
+            else:
+                yield doc_id, response
+
+        for doc_id, raw in get_many_from_s3(missing, self.fetch_from_bucket, concurrency):
+            try:
+                response = self.load(doc_id, raw)
+            except Exception as e:
+                response = {'status': 500, 'message': str(e)}
+            yield doc_id, response
+
+
+    def fetch_from_bucket(self, bucket, doc_id):
+        ''' Gets the compact parse for a document if there is one, otherwise its XML
+        :param bucket: the bucket to read from
+        :param doc_id: the id of the document in Solr
+        :return: a response keyed by 'compact' or by the doc id
+        '''
+        if READ_COMPACT_PARSES:
+            contents = get_key_contents(bucket, compact_parse.key_name(doc_id))
+            if contents is not None:
+                return {'status': 200, 'compact': contents}
+        return ParsedXmlService().fetch_from_bucket(bucket, doc_id)
+
+
+    def load(self, doc_id, raw):
+        ''' Decodes or parses a response from fetch_from_bucket and memoizes it.
+        Parsing XML backfills the compact parse; an unreadable compact parse falls back to XML.
+        :param doc_id: the id of the document in Solr
+        :param raw: a response from fetch_from_bucket
+        '''
+        if raw['status'] != 200:
+            return raw
+
+        if 'compact' in raw:
+            try:
+                parsed, size = compact_parse.loads(raw['compact'])
+                response = {'status': 200, doc_id: parsed}
+                parse_cache().set(doc_id, response, size=size)
+                return response
+            except ValueError:
+                raw = ParsedXmlService().get(doc_id)
+                if raw['status'] != 200:
+                    return raw
+
+        parsed = corenlp_xml.parse(raw[doc_id])
+        response = {'status': 200, doc_id: parsed}
+        parse_cache().set(doc_id, response, size=len(raw[doc_id]))
+        if WRITE_COMPACT_PARSES:
+            try:
+                key = Key(get_s3_bucket())
+                key.key = compact_parse.key_name(doc_id)
+                key.set_contents_from_string(compact_parse.dumps(parsed, len(raw[doc_id])))
+            except (S3ResponseError, socket.error):
+                pass  # we'll backfill it next time
+        return response
+
+
 class CoreferenceCountsService(RestfulResource):
 
     ''' Read-only service responsible for providing data on mention coreference
@@ -205,17 +454,55 @@ class PhraseService():
 
     @staticmethod
     def phrases_from_json(json_parse, phrase_types):
-        return [' '.join(f.leaves())
+        phrase_types = frozenset(phrase_types)
+        return [phrase
                 for sentence in asList(json_parse.get('root', {}).get('document', {}).get('sentences', {}).get('sentence', []))
-                for f in nltk.Tree.parse(sentence.get('parse', '')).subtrees() if f.node in phrase_types
+                for phrase in PhraseService.phrases_from_parse(sentence.get('parse', ''), phrase_types)
                 ] if not isEmptyDoc(json_parse) else []
 
 
+    @staticmethod
+    def phrases_from_parse(parse, phrase_types):
+        ''' Scans a bracketed parse once and returns the leaves under every node with a requested label,
+        in the same order as nltk.Tree.subtrees(), without building a tree
+        :param parse: a bracketed parse string
+        :param phrase_types: a set of labels, e.g. NP
+        :return: a list of space-joined phrases
+        '''
+        leaves = []
+        phrases = []
+        open_nodes = []
+        expect_label = False
+        for token in PARSE_TOKENS.findall(parse or ''):
+            if expect_label:
+                # nltk allows an empty label, e.g. "( (S ...))"
+                expect_label = False
+                label = token if token != '(' and token != ')' else ''
+                if label in phrase_types:
+                    phrases.append(None)
+                    open_nodes.append((len(phrases) - 1, len(leaves)))
+                else:
+                    open_nodes.append(None)
+                if label:
+                    continue
+            if token == '(':
+                expect_label = True
+            elif token == ')':
+                node = open_nodes.pop()
+                if node is not None:
+                    phrases[node[0]] = ' '.join(leaves[node[1]:])
+            else:
+                leaves.append(token)
+        return phrases
+
+
+
 class AllNounPhrasesService(RestfulResource):
 
     ''' Read-only service that gives all noun phrases for a document '''
 
     #@cachedServiceRequest
+    @documentScopedRequest
     def get(self, doc_id):
         ''' Get noun phrases for a document 
         :param doc_id: the id of the document in Solr
@@ -248,7 +535,7 @@ class HeadsService(RestfulResource):
         counter = 0
         if not isEmptyDoc(dict):
             return {'status':200,
-                    doc_id: [title_confirmation.preprocess(MrgSentence(sentence.get('parse', '')).nodes.getTermHead().getString()) \
+                    doc_id: [title_confirmation.preprocess(MrgSentence(sentence.get('parse', ''), lazy=True).getTermHead().string) \
                                  for sentence in asList(dict.get('root', {}).get('document', {}).get('sentences', {}).get('sentence', [])) \
                                  ]
                     }
@@ -263,15 +550,11 @@ class HeadsCountService(RestfulResource):
 
     @cachedServiceRequest
     def get(self, wiki_id):
-        page_doc_response = ListDocIdsService().get(wiki_id)
-        if page_doc_response['status'] != 200:
-            return page_doc_response
+        aggregate, error_response = wiki_aggregate(wiki_id, HeadsService)
+        if error_response is not None:
+            return error_response
 
-        page_doc_ids = page_doc_response.get(wiki_id, [])
-        hs = HeadsService()
-        allHeads = [head for heads in filter(lambda x: x is not None, map(hs.nestedGet, page_doc_ids)) for head in heads]
-        singleHeads = set(allHeads)
-        return {'status':200, wiki_id: dict(zip(singleHeads, map(allHeads.count, singleHeads))) }
+        return {'status':200, wiki_id: dict(aggregate.counts) }
 
 
 class TopHeadsService(RestfulResource):
@@ -279,24 +562,70 @@ class TopHeadsService(RestfulResource):
     ''' Gets the most frequent syntactic in a wiki '''
     @cachedServiceRequest
     def get(self, wiki_id):
-        heads_to_counts = HeadsCountService().nestedGet(wiki_id, {})
-        items = sorted(heads_to_counts.items(), \
-                           key=lambda item:int(item[1]), \
-                           reverse=True)
+        if TOP_HEADS_LIMIT is None:
+            heads_to_counts = HeadsCountService().nestedGet(wiki_id, {})
+            items = sorted(heads_to_counts.items(), \
+                               key=lambda item:int(item[1]), \
+                               reverse=True)
+            return {'status': 200, wiki_id: items}
+
+        bucket = get_s3_bucket()
+        aggregate = aggregates.WikiAggregate.load(bucket, wiki_id, HeadsService.__name__)
+        if aggregate is not None:
+            aggregate.fold_deltas(bucket)
+            items = heapq.nlargest(TOP_HEADS_LIMIT, aggregate.counts.items(), key=lambda item:item[1])
+            return {'status': 200, wiki_id: items}
 
-        return {'status': 200, wiki_id: items}
+        page_doc_response = ListDocIdsService().get(wiki_id)
+        if page_doc_response['status'] != 200:
+            return page_doc_response
+        items = fan_out(page_doc_response.get(wiki_id, []), NestedGet(HeadsService, []),
+                        counting.TopKReducer(TOP_HEADS_LIMIT, TOP_HEADS_CAPACITY))
+        return {'status': 200, wiki_id: items, 'approximate': True}
 
 
 class SolrPageService(RestfulResource):
 
-    ''' Read-only service that accesses a single page-level document from Solr '''
+    ''' Read-only service that accesses page-level documents from Solr '''
     
-    def get(self, doc_id):
+    def get(self, doc_id, fl=None):
         ''' Get page from solr for a document id 
         :param doc_id: the id of the document in Solr
+        :param fl: a comma-separated list of fields to return; defaults to all of them
+        '''
+        params = {'q': 'id:%s' % doc_id}
+        if fl is not None:
+            params['fl'] = fl
+        return {doc_id: (solr.client().docs('main', params) or [None])[0], 'status':200}
+
+    def get_many(self, doc_ids, fl=None, batch_size=solr.BATCH_SIZE, realtime=False):
+        ''' Get pages from solr for many document ids, batch_size per request
+        :param doc_ids: a list of document ids
+        :param fl: a comma-separated list of fields to return; defaults to all of them
+        :param batch_size: the most documents to ask for at once
+        :param realtime: use the real-time get handler instead of an id:(a OR b ...) query
+        :return: a response keyed by document id, with None for documents Solr doesn't have
+        '''
+        response = solr.client().get_many('main', doc_ids, fl, batch_size, realtime)
+        response['status'] = 200
+        return response
+
+
+class SolrPages:
+
+    ''' Picklable mapper of doc id to its Solr document, which fetches a whole fan-out chunk at once '''
+
+    def __init__(self, fl=None):
+        ''' Constructor method
+        :param fl: a comma-separated list of fields to return
         '''
-        return {doc_id: requests.get(SOLR_URL+'/solr/main/select/', params={'q':'id:%s' % doc_id, 'wt':'json'}
-).json().get('response', {}).get('docs',[None])[0], 'status':200}
+        self.fl = fl
+
+    def __call__(self, doc_id):
+        return SolrPageService().get(doc_id, self.fl).get(doc_id)
+
+    def map_many(self, doc_ids):
+        return solr.client().get_many('main', doc_ids, self.fl)
 
 
 class SolrWikiService(RestfulResource):
@@ -311,8 +640,7 @@ class SolrWikiService(RestfulResource):
         if MEMOIZED_WIKIS.get(wiki_id, None):
             return {wiki_id: MEMOIZED_WIKIS[wiki_id]}
 
-        serviceResponse = {wiki_id: requests.get(SOLR_URL+'/solr/xwiki/select/', params={'q':'id:%s' % wiki_id, 'wt':'json'}
-).json().get('response', {}).get('docs',[None])[0], 'status':200}
+        serviceResponse = {wiki_id: (solr.client().docs('xwiki', {'q': 'id:%s' % wiki_id}) or [None])[0], 'status':200}
 
         MEMOIZED_WIKIS = dict(MEMOIZED_WIKIS.items() + serviceResponse.items())
 
@@ -329,7 +657,7 @@ class NaiveSentimentService(RestfulResource):
         ''' For a document id, get data on the text's polarity and subjectivity 
         :param doc_id: the id of the document in Solr
         '''
-        blob = TextBlob(SolrPageService().get(doc_id).get(doc_id, {}).get('html_en', ''))
+        blob = TextBlob((SolrPageService().get(doc_id, 'id,html_en').get(doc_id) or {}).get('html_en', ''))
         sentiments = [s.sentiment for s in blob.sentences]
         polarities = [s[0] for s in sentiments]
         subjectivities = [s[1] for s in sentiments]
@@ -434,96 +762,44 @@ class DocumentEntitySentimentService(RestfulResource):
         if sentimentResponse['status'] is not 200:
             return sentimentResponse
 
-        entities = EntitiesService().nestedGet(doc_id, [])
+        entities = set(EntitiesService().nestedGet(doc_id, []))
+        phrase_sentiment = sentimentResponse[doc_id]['averagePhraseSentiment']
+        confirmed = title_confirmation.check_wp_many(phrase_sentiment.keys())
 
         return {'status': 200,
-                doc_id: dict(filter(lambda x: title_confirmation.check_wp(x[0]) or x[0] in entities,
-                                        sentimentResponse[doc_id]['averagePhraseSentiment'].items()))
+                doc_id: dict([(phrase, sentiment) for phrase, sentiment in phrase_sentiment.items()
+                              if phrase in confirmed or phrase in entities])
                 }
 
 
-def update_dict_dess(tup):
-    managed, doc_id, doc_ids = tup
-    doc_ids += [doc_id]
-    print len(doc_ids)
-    service_response = DocumentEntitySentimentService().nestedGet(doc_id, {})
-    for key in service_response:
-        managed[key] = managed.get(key, []) + [service_response[key]]
-
-
 class WikiEntitySentimentService(RestfulResource):
 
     ''' Does document entity sentiment service across all documents '''
     @cachedServiceRequest
     def get(self, wiki_id):
 
-        global USE_MULTIPROCESSING, MP_NUM_CORES
-
         page_doc_response = ListDocIdsService().get(wiki_id)
         if page_doc_response['status'] != 200:
             return page_doc_response
 
-
-        if USE_MULTIPROCESSING:
-            m = Manager()
-            d = m.dict()
-            l = m.list()
-            results = Pool(processes=MP_NUM_CORES).map(update_dict_dess, [(d, doc_id, l) for doc_id in page_doc_response[wiki_id]])
-            entitySentiment = dict(d.items())
-        else:
-            entitySentiment = {}
-            dss = DocumentSentimentService()
-            counter = 0
-            total = len(page_doc_response[wiki_id])
-            for doc_id in page_doc_response[wiki_id]:
-                sent_response = dss.nestedGet(doc_id, {})
-                avg_phrase_sentiment = sent_response.get('averagePhraseSentiment', {})
-                print "%d / %d (%d keys)" % (counter, total, len(avg_phrase_sentiment.keys()))
-                counter += 1
-                for key in avg_phrase_sentiment:
-                    entitySentiment[key] = entitySentiment.get(key, []) + [avg_phrase_sentiment[key]]
+        entitySentiment = fan_out(page_doc_response[wiki_id], NestedGet(DocumentEntitySentimentService, {}),
+                                  fanout.KeyedValuesReducer())
 
         return {'status': 200, wiki_id: dict([(key, numpy.mean([i+1 for i in entitySentiment[key]])+1) for key in entitySentiment])}
 
 
-def update_dict_wpdess(tup):
-    managed, doc_id, ids = tup
-    ids += [doc_id]
-    print len(ids)
-    service_response = WpDocumentEntitySentimentService().nestedGet(doc_id, {})
-    for key in service_response:
-        managed[key] = managed.get(key, []) + [service_response[key]]
-
-
 class WpWikiEntitySentimentService(RestfulResource):
 
     ''' Does document entity sentiment service across all documents '''
     @cachedServiceRequest
     def get(self, wiki_id):
 
-        global USE_MULTIPROCESSING, MP_NUM_CORES
-
         page_doc_response = ListDocIdsService().get(wiki_id)
         if page_doc_response['status'] != 200:
             return page_doc_response
 
-        if USE_MULTIPROCESSING:
-            m = Manager()
-            d = m.dict()
-            l = m.list()
-            results = Pool(processes=MP_NUM_CORES).map(update_dict_wpdess, [(d, i, l) for i in page_doc_response[wiki_id]])
-            entitySentiment = dict(d.items())
-        else:
-            entitySentiment = {}
-            dss = WpDocumentEntitySentimentService()
-            total = len(page_doc_response[wiki_id])
-            counter = 0
-            for doc_id in page_doc_response[wiki_id]:
-                sent_response = dss.NestedGet(doc_id)
-                if sent_response is not None:
-                    print "%d / %d (%d keys)" % (counter, total, len(sent_response))
-                    for key in sent_response:
-                        entitySentiment[key] = entitySentiment.get(key, []) + sent_response[key]
+        entitySentiment = fan_out(page_doc_response[wiki_id], NestedGet(WpDocumentEntitySentimentService, {}),
+                                  fanout.KeyedValuesReducer())
 
         return {'status': 200, wiki_id: dict([(key, numpy.mean([i + 1 for i in entitySentiment[key]])-1) for key in entitySentiment])}
 
@@ -538,11 +814,13 @@ class WpDocumentEntitySentimentService(RestfulResource):
         if sentimentResponse['status'] is not 200:
             return sentimentResponse
 
-        entities = WpEntitiesService().nestedGet(doc_id, [])
+        entities = set(WpEntitiesService().nestedGet(doc_id, []))
+        phrase_sentiment = sentimentResponse[doc_id]['averagePhraseSentiment']
+        confirmed = title_confirmation.check_wp_many(phrase_sentiment.keys())
 
         return {'status': 200,
-                doc_id: dict(filter(lambda x: title_confirmation.check_wp(x[0]) or x[0] in entities,
-                                        sentimentResponse[doc_id]['averagePhraseSentiment'].items()))
+                doc_id: dict([(phrase, sentiment) for phrase, sentiment in phrase_sentiment.items()
+                              if phrase in confirmed or phrase in entities])
                 }
 
 class AllEntitiesSentimentAndCountsService(RestfulResource):
@@ -603,14 +881,16 @@ class SentencesForEntityService(RestfulResource):
         return {'status': 200, entity: [{'sentiment': sents[i].get('@sentiment', None), 'sentence': sents_processed[i]} for i in range(0, len(sents)) if i in sentences_to_add]}
 
 
-def add_brand_sent_sentiment(d):
-    update_list, doc_ids, doc_id, brand = d
-    print len(doc_ids)
-    doc_ids += [doc_id]
-    # multiprocessing bottleneck fix
-    #open('data_output.json', 'a').write("%s,%s\n" % (doc_id, json.dumps(SentencesForEntityService().get(doc_id, brand).get(brand, []))))
-    return SentencesForEntityService().get(doc_id, brand).get(brand, [])
-    
+class BrandSentences:
+
+    ''' Picklable mapper of doc id to the sentences mentioning a brand, for fanning out '''
+
+    def __init__(self, brand):
+        self.brand = brand
+
+    def __call__(self, doc_id):
+        return SentencesForEntityService().get(doc_id, self.brand).get(self.brand, [])
+
 
 class BrandSentimentReportService(RestfulResource):
 
@@ -626,27 +906,9 @@ class BrandSentimentReportService(RestfulResource):
         if page_doc_response['status'] != 200:
             return page_doc_response
 
-        if USE_MULTIPROCESSING:
-            m = Manager()
-            d = m.list()
-            l = m.list()
-            done_ids = dict([(line.split(',')[0], True) for line in open('data_output.json', 'r')])
-            print len(done_ids)
-            doc_ids = filter(lambda x: not done_ids.get(x, False), page_doc_response[wiki_id])
-            #sents = [a for b in Pool(processes=MP_NUM_CORES).map(add_brand_sent_sentiment, [(d, l, i, brand) for i in doc_ids]) for a in b]
-            Pool(processes=MP_NUM_CORES).map(add_brand_sent_sentiment, [(d, l, i, brand) for i in doc_ids])
-        else:
-            ses = SentencesForEntityService()
-            total = len(page_doc_response[wiki_id])
-            counter = 0
-            sents = []
-            for doc_id in page_doc_response[wiki_id]:
-                resp = ses.get(doc_id, brand)
-                sents += (doc_id, resp.get(brand, []))
-                counter += 1
-                print "%d / %d" % (counter, total)
-
-        return {'status': 200, brand: dict(sents)}
+        sents = fan_out(page_doc_response[wiki_id], BrandSentences(brand), fanout.DocumentValuesReducer())
+
+        return {'status': 200, brand: sents}
         
 
 
@@ -684,8 +946,8 @@ class WpEntitiesService(RestfulResource):
         :param doc_id: the id of the document
         """
         nps = AllNounPhrasesService().get(doc_id).get(doc_id, [])
-        nps_filtered = filter(lambda x: len(x.strip()) > 0,  filter(title_confirmation.check_wp, filter(lambda x: len(x.split(' ')) <= 5,  list(set(nps)))))
-        return {'status':200, doc_id: [np for np in nps if np in nps_filtered] }
+        confirmed = title_confirmation.check_wp_many([np for np in set(nps) if len(np.split(' ')) <= 5 and len(np.strip()) > 0])
+        return {'status':200, doc_id: [np for np in nps if np in confirmed] }
 
 class EntitiesService(RestfulResource):
 
@@ -700,21 +962,64 @@ class EntitiesService(RestfulResource):
 
         nps = AllNounPhrasesService().get(doc_id).get(doc_id, [])
 
-        titles = AllTitlesService().nestedGet(doc_id.split('_')[0])
-        redirects = RedirectsService().nestedGet(doc_id.split('_')[0])
-
         if nps is None:
             return {'status': 200, doc_id:{'titles': [], 'redirects': {}}}
 
-        checked_titles = filter(lambda x: x in titles, map(title_confirmation.preprocess, nps))
+        titles = wiki_titles(doc_id.split('_')[0])
+        redirects = wiki_redirects(doc_id.split('_')[0])
+
+        checked_titles = [title for title in map(title_confirmation.preprocess, nps) if title in titles]
 
         resp['titles'] = list(set(checked_titles))
 
-        resp['redirects'] = dict(filter(lambda x: x[1], map(lambda x: (x, redirects.get(x, None)), checked_titles)))
+        resp['redirects'] = dict([(title, redirects[title]) for title in checked_titles if redirects.get(title)])
 
         return {'status':200, doc_id:resp}
 
 
+class CoreferenceIndex:
+
+    ''' A document's coreference chains, preprocessed once and indexed by mention, for the entity count services '''
+
+    def __init__(self, paraphrases):
+        ''' Constructor method
+        :param paraphrases: a dict of representative mention to its mentions, from CoreferenceCountsService
+        '''
+        self.preprocessed = {}
+        self.chains = dict([(self.preprocess(representative), map(self.preprocess, mentions))
+                            for representative, mentions in paraphrases.items()])
+        self.mention_counts = {}
+        for representative, chain in self.chains.items():
+            for mention in chain:
+                self.mention_counts.setdefault(mention, len(chain))
+
+    def preprocess(self, phrase):
+        ''' title_confirmation.preprocess, computed once per distinct phrase in the document '''
+        try:
+            return self.preprocessed[phrase]
+        except KeyError:
+            result = self.preprocessed[phrase] = title_confirmation.preprocess(phrase)
+            return result
+
+    def count(self, val, canonical=None):
+        ''' The size of the coreference chain an entity belongs to, looked up by its canonical
+        title first, then by the title it appeared as
+        :param val: the preprocessed title
+        :param canonical: the title it redirects to, if any
+        :return: an int, or None if the entity isn't in any chain
+        '''
+        canonical = val if canonical is None else canonical
+        if canonical in self.chains:
+            return len(self.chains[canonical])
+        if canonical != val and val in self.chains:
+            return len(self.chains[val])
+        if canonical in self.mention_counts:
+            return self.mention_counts[canonical]
+        if canonical != val and val in self.mention_counts:
+            return self.mention_counts[val]
+        return None
+
+
 class EntityCountsService(RestfulResource):
     
     ''' Counts the entities using coreference counts in a given document '''
@@ -725,29 +1030,15 @@ class EntityCountsService(RestfulResource):
         '''
         entitiesresponse = EntitiesService().get(doc_id).get(doc_id, {})
         coreferences = CoreferenceCountsService().get(doc_id).get(doc_id, {})
-        
-        exists = lambda x: x is not None
-        docParaphrases = coreferences.get('paraphrases', {})
-        coref_mention_keys = map(title_confirmation.preprocess, docParaphrases.keys())
-        coref_mention_values = map(title_confirmation.preprocess, [item for sublist in docParaphrases.values() for item in sublist])
-        paraphrases = dict([(title_confirmation.preprocess(item[0]), map(title_confirmation.preprocess, item[1]))\
-                            for item in docParaphrases.items()])
+        index = CoreferenceIndex(coreferences.get('paraphrases', {}))
 
         counts ={}
 
         for val in entitiesresponse['titles']:
-            try:
-                canonical = entitiesresponse['redirects'].get(val, val)
-                if canonical in coref_mention_keys:
-                    counts[canonical] = len(paraphrases[canonical])
-                elif canonical != val and val in coref_mention_keys:
-                    counts[canonical] = len(paraphrases[val])
-                elif canonical in coref_mention_values:
-                    counts[canonical] = len(filter(lambda x: canonical in x[1], paraphrases.items())[0][1])
-                elif canonical != val and val in coref_mention_values:
-                    counts[canonical] = len(filter(lambda x: val in x[1], paraphrases.items())[0][1])
-            except Exception as e:
-                print e.message
+            canonical = entitiesresponse['redirects'].get(val, val)
+            count = index.count(val, canonical)
+            if count is not None:
+                counts[canonical] = count
 
         return {doc_id: counts, 'status': 200}
 
@@ -763,29 +1054,14 @@ class WpEntityCountsService(RestfulResource):
 
         entities = WpEntitiesService().nestedGet(doc_id)
         coreferences = CoreferenceCountsService().get(doc_id).get(doc_id, {})
-        
-        exists = lambda x: x is not None
-        docParaphrases = coreferences.get('paraphrases', {})
-        coref_mention_keys = map(title_confirmation.preprocess, docParaphrases.keys())
-        coref_mention_values = map(title_confirmation.preprocess, [item for sublist in docParaphrases.values() for item in sublist])
-        paraphrases = dict([(title_confirmation.preprocess(item[0]), map(title_confirmation.preprocess, item[1]))\
-                            for item in docParaphrases.items()])
+        index = CoreferenceIndex(coreferences.get('paraphrases', {}))
 
         counts ={}
 
-        for val in map(title_confirmation.preprocess, entities):
-            try:
-                canonical = val
-                if canonical in coref_mention_keys:
-                    counts[canonical] = len(paraphrases[canonical])
-                elif canonical != val and val in coref_mention_keys:
-                    counts[canonical] = len(paraphrases[val])
-                elif canonical in coref_mention_values:
-                    counts[canonical] = len(filter(lambda x: canonical in x[1], paraphrases.items())[0][1])
-                elif canonical != val and val in coref_mention_values:
-                    counts[canonical] = len(filter(lambda x: val in x[1], paraphrases.items())[0][1])
-            except:
-                pass
+        for val in set(map(index.preprocess, entities or [])):
+            count = index.count(val)
+            if count is not None:
+                counts[val] = count
 
         return {doc_id: counts, 'status': 200}
 
@@ -827,25 +1103,13 @@ class WikiEntitiesService(RestfulResource):
         :param wiki_id: the id of the wiki
         '''
 
-        page_doc_response = ListDocIdsService().get(wiki_id)
-        if page_doc_response['status'] != 200:
-            return page_doc_response
-
-        entities_to_count = {}
-        entity_service = EntityCountsService()
-
-        counter = 1
-        page_doc_ids = page_doc_response.get(wiki_id, [])
-        total = len(page_doc_ids)
-        for page_doc_id in page_doc_ids:
-            entities_with_count = entity_service.get(page_doc_id).get(page_doc_id, {}).items()
-            map(lambda x: entities_to_count.__setitem__(x[0], entities_to_count.get(x[0], 0) + x[1]) , entities_with_count)
-            print '(%s/%s)' % (counter,total)
-            counter += 1
+        aggregate, error_response = wiki_aggregate(wiki_id, EntityCountsService)
+        if error_response is not None:
+            return error_response
 
         counts_to_entities = {}
-        for entity in entities_to_count.keys():
-            cnt = entities_to_count[entity]
+        for entity in aggregate.counts.keys():
+            cnt = aggregate.counts[entity]
             counts_to_entities[cnt] = counts_to_entities.get(cnt, []) + [entity]
 
         return {wiki_id:counts_to_entities, 'status':200}
@@ -866,9 +1130,8 @@ class WikiPageEntitiesService(RestfulResource):
         if page_doc_response['status'] != 200:
             return page_doc_response
 
-        entity_service = EntityCountsService()
-
-        return {'status': 200, wiki_id: dict([(page_doc_id, entity_service.nestedGet(page_doc_id)) for page_doc_id in page_doc_response.get(wiki_id, [])])}
+        return {'status': 200, wiki_id: fan_out(page_doc_response.get(wiki_id, []), NestedGet(EntityCountsService),
+                                                fanout.DocumentValuesReducer())}
 
 
 class WpWikiPageEntitiesService(RestfulResource):
@@ -887,9 +1150,8 @@ class WpWikiPageEntitiesService(RestfulResource):
         if page_doc_response['status'] != 200:
             return page_doc_response
 
-        entity_service = WpEntityCountsService()
-
-        return {'status': 200, wiki_id: dict([(page_doc_id, entity_service.nestedGet(page_doc_id)) for page_doc_id in page_doc_response.get(wiki_id, [])])}
+        return {'status': 200, wiki_id: fan_out(page_doc_response.get(wiki_id, []), NestedGet(WpEntityCountsService),
+                                                fanout.DocumentValuesReducer())}
 
 
 class WpWikiEntitiesService(RestfulResource):
@@ -904,25 +1166,13 @@ class WpWikiEntitiesService(RestfulResource):
         :param wiki_id: the id of the wiki
         '''
 
-        page_doc_response = ListDocIdsService().get(wiki_id)
-        if page_doc_response['status'] != 200:
-            return page_doc_response
-
-        entities_to_count = {}
-        entity_service = WpEntityCountsService()
-
-        counter = 1
-        page_doc_ids = page_doc_response.get(wiki_id, [])
-        total = len(page_doc_ids)
-        for page_doc_id in page_doc_ids:
-            entities_with_count = entity_service.get(page_doc_id).get(page_doc_id, {}).items()
-            map(lambda x: entities_to_count.__setitem__(x[0], entities_to_count.get(x[0], 0) + x[1]) , entities_with_count)
-            print '(%s/%s)' % (counter,total)
-            counter += 1
+        aggregate, error_response = wiki_aggregate(wiki_id, WpEntityCountsService)
+        if error_response is not None:
+            return error_response
 
         counts_to_entities = {}
-        for entity in entities_to_count.keys():
-            cnt = entities_to_count[entity]
+        for entity in aggregate.counts.keys():
+            cnt = aggregate.counts[entity]
             counts_to_entities[cnt] = counts_to_entities.get(cnt, []) + [entity]
 
         return {wiki_id:counts_to_entities, 'status':200}
@@ -941,25 +1191,13 @@ class EntityDocumentCountsService(RestfulResource):
         :param wiki_id: the id of the wiki
         '''
 
-        page_doc_response = ListDocIdsService().get(wiki_id)
-        if page_doc_response['status'] != 200:
-            return page_doc_response
-
-        entities_to_count = {}
-        entity_service = EntityCountsService()
-
-        counter = 1
-        page_doc_ids = page_doc_response.get(wiki_id, [])
-        total = len(page_doc_ids)
-        for page_doc_id in page_doc_ids:
-            entities_with_count = entity_service.get(page_doc_id).get(page_doc_id, {}).items()
-            map(lambda x: entities_to_count.__setitem__(x[0], entities_to_count.get(x[0], 0) + 1) , entities_with_count)
-            counter += 1
-            print "%d / %d" % (counter, total)
+        aggregate, error_response = wiki_aggregate(wiki_id, EntityCountsService)
+        if error_response is not None:
+            return error_response
 
         counts_to_entities = {}
-        for entity in entities_to_count.keys():
-            cnt = entities_to_count[entity]
+        for entity in aggregate.doc_counts.keys():
+            cnt = aggregate.doc_counts[entity]
             counts_to_entities[cnt] = counts_to_entities.get(cnt, []) + [entity]
 
         return {wiki_id:counts_to_entities, 'status':200}
@@ -977,24 +1215,13 @@ class WpEntityDocumentCountsService(RestfulResource):
         :param wiki_id: the id of the wiki
         '''
 
-        page_doc_response = ListDocIdsService().get(wiki_id)
-        if page_doc_response['status'] != 200:
-            return page_doc_response
-
-        entities_to_count = {}
-        entity_service = WpEntityCountsService()
-
-        counter = 1
-        page_doc_ids = page_doc_response.get(wiki_id, [])
-        total = len(page_doc_ids)
-        for page_doc_id in page_doc_ids:
-            entities_with_count = entity_service.get(page_doc_id).get(page_doc_id, {}).items()
-            map(lambda x: entities_to_count.__setitem__(x[0], entities_to_count.get(x[0], 0) + 1) , entities_with_count)
-            counter += 1
+        aggregate, error_response = wiki_aggregate(wiki_id, WpEntityCountsService)
+        if error_response is not None:
+            return error_response
 
         counts_to_entities = {}
-        for entity in entities_to_count.keys():
-            cnt = entities_to_count[entity]
+        for entity in aggregate.doc_counts.keys():
+            cnt = aggregate.doc_counts[entity]
             counts_to_entities[cnt] = counts_to_entities.get(cnt, []) + [entity]
 
         return {wiki_id:counts_to_entities, 'status':200}
@@ -1003,56 +1230,162 @@ class WpEntityDocumentCountsService(RestfulResource):
 class ListDocIdsService(RestfulResource):
     
     ''' Service to expose resources in WikiDocumentIterator '''
-    @cachedServiceRequest
-    def get(self, wiki_id, start=0, limit=None):
-
+    def get(self, wiki_id):
+        ''' Lists every document ID for a wiki, from its manifest when that's fresh,
+        otherwise from a full listing that the manifest is then rebuilt from.
+        Not response-cached: the manifest is the cache, and it knows when it's stale.
+        :param wiki_id: the id of the wiki
+        '''
         bucket = get_s3_bucket()
-        keys = bucket.get_all_keys(prefix='xml/%s/' % (str(wiki_id)), max_keys=1)
-        if len(keys) == 0:
-            return {'status':500, 'message':'Wiki not yet processed'}
-
-        if limit:
-            ids = ArticleDocIdIterator(wiki_id)[start:limit]
+        manifest = doc_manifest.Manifest.load(bucket, wiki_id)
+        if manifest is None or not manifest.is_fresh():
+            manifest = doc_manifest.Manifest.from_doc_ids(wiki_id, ArticleDocIdIterator(wiki_id), manifest)
+            if not manifest.fold_deltas(bucket):
+                manifest.save(bucket)
         else:
-            ids = [id for id in ArticleDocIdIterator(wiki_id)[start:]]
+            manifest.fold_deltas(bucket)
+
+        ids = manifest.doc_ids()
+        if len(ids) == 0:
+            return {'status':500, 'message':'Wiki not yet processed'}
         return {wiki_id: ids, 'status':200, 'numFound':len(ids)}
 
+    def page(self, wiki_id, start=0, limit=None, marker=None):
+        ''' Lists one page of document IDs for a wiki, straight from S3 and uncached.
+        Only as many keys as the page needs are listed.
+        :param wiki_id: the id of the wiki
+        :param start: how many IDs to skip
+        :param limit: the most IDs to return
+        :param marker: the "next" cursor of a previous page, to carry on after it
+        '''
+        iterator = ArticleDocIdIterator(wiki_id, marker, min(start + limit, ArticleDocIdIterator.PAGE_SIZE) if limit else None)
+        ids = list(islice(iterator, start, start + limit if limit else None))
+        if len(ids) == 0 and not marker and iterator.marker == '':
+            return {'status':500, 'message':'Wiki not yet processed'}
+        response = {wiki_id: ids, 'status':200, 'numFound':len(ids)}
+        if limit and len(ids) == limit:
+            response['next'] = iterator.marker
+        return response
+
 
 
 class ArticleDocIdIterator:
 
-    ''' Get all existing document IDs for a wiki -- not a service '''
+    ''' Lazily lists the document IDs for a wiki, one page of S3 keys at a time -- not a service.
+    The marker is the S3 key of the last ID handed out, so a new iterator can resume from it.
+    '''
+
+    PAGE_SIZE = 1000  # the most keys S3 will list per request
     
-    def __init__(self, wid):
+    def __init__(self, wid, marker=None, page_size=None):
         ''' Constructor method 
         :param wid: the wiki ID we want to iterate over
+        :param marker: a cursor from a previous iterator; listing starts after it
+        :param page_size: how many keys to list per request
         '''
-        bucket = get_s3_bucket()
         self.wid = wid
-        self.counter = 0
-        def id_from_key(x):
-            split = x.split('/')
-            return "%s_%s" % (split[-2], split[-1].replace('.xml', ''))
-        self.keys = [id_from_key(key.key) for key in bucket.list(prefix='xml/'+str(wid)+'/') if key.key.endswith('.xml')]
+        self.prefix = 'xml/%s/' % str(wid)
+        self.marker = marker or ''
+        self.page_size = page_size or self.PAGE_SIZE
+
+    @staticmethod
+    def id_from_key(key_name):
+        split = key_name.split('/')
+        return "%s_%s" % (split[-2], split[-1].replace('.xml', ''))
+
+    def key_names(self):
+        ''' Yields XML key names after the marker, listing a page at a time as they're consumed '''
+        bucket = get_s3_bucket()
+        marker = self.marker
+        while True:
+            keys = bucket.get_all_keys(prefix=self.prefix, marker=marker, max_keys=self.page_size)
+            for key in keys:
+                if key.name.endswith('.xml'):
+                    yield key.name
+            if len(keys) == 0 or not keys.is_truncated:
+                return
+            marker = keys[-1].name
 
     def __iter__(self):
-        ''' Iterator method '''
-        return self.next()
+        ''' Yields article IDs, advancing the marker as each is handed out '''
+        for key_name in self.key_names():
+            self.marker = key_name
+            yield self.id_from_key(key_name)
+
+    def pages(self):
+        ''' Yields lists of article IDs, one per S3 listing request, so work can begin on the first
+        page while later ones are still being listed
+        '''
+        page = []
+        for doc_id in self:
+            page.append(doc_id)
+            if len(page) == self.page_size:
+                yield page
+                page = []
+        if page:
+            yield page
 
     def __getitem__(self, index):
-        ''' Allows array access 
-        :param index: int value of index
+        ''' Allows array access without listing past what's needed
+        :param index: a non-negative int or slice
         '''
-        return self.keys[index]
-
-    def next(self):
-        ''' Get next article ID '''
-        if self.counter == len(self.keys):
-            raise StopIteration
-        self.counter += 1
-        return self.keys[self.counter-1]
-        
+        if isinstance(index, slice):
+            return list(islice(self, index.start, index.stop, index.step))
+        for doc_id in islice(self, index, index + 1):
+            return doc_id
+        raise IndexError(index)
+
+
+def wiki_aggregate(wiki_id, service_class):
+    ''' Gets the persisted aggregate of a document service over a wiki, folding in any pending
+    per-document deltas. The first time through, it's built from every document in the wiki.
+    :param wiki_id: the id of the wiki
+    :param service_class: the document service being aggregated, e.g. EntityCountsService
+    :return: a tuple of the aggregates.WikiAggregate and an error response, one of which is None
+    '''
+    bucket = get_s3_bucket()
+    service_name = service_class.__name__
+    aggregate = aggregates.WikiAggregate.load(bucket, wiki_id, service_name)
+    if aggregate is not None:
+        aggregate.fold_deltas(bucket)
+        return aggregate, None
+
+    page_doc_response = ListDocIdsService().get(wiki_id)
+    if page_doc_response['status'] != 200:
+        return None, page_doc_response
 
+    aggregate = fan_out(page_doc_response.get(wiki_id, []), NestedGet(service_class),
+                        aggregates.AggregateReducer(wiki_id, service_name))
+
+    if not aggregate.fold_deltas(bucket):
+        aggregate.save(bucket)
+    return aggregate, None
+
+
+def wiki_titles(wiki_id):
+    ''' A wiki's titles as a frozenset, hashed once per wiki and shared by all of its documents.
+    Reads through AllTitlesService, so its cached responses are still used.
+    :param wiki_id: the id of the wiki
+    '''
+    key = 'AllTitlesService/%s' % wiki_id
+    titles = title_confirmation.wiki_cache().get(key)
+    if titles is None:
+        titles = frozenset(AllTitlesService().nestedGet(wiki_id, []))
+        title_confirmation.wiki_cache().set(key, titles, size=title_confirmation.estimate_size(titles))
+    return titles
+
+
+def wiki_redirects(wiki_id):
+    ''' A wiki's redirects as a compact dict of redirect to canonical title, built once per wiki.
+    Reads through RedirectsService, so its cached responses are still used.
+    :param wiki_id: the id of the wiki
+    '''
+    key = 'RedirectsService/%s' % wiki_id
+    redirects = title_confirmation.wiki_cache().get(key)
+    if redirects is None:
+        redirects = title_confirmation.compact_redirects(RedirectsService().nestedGet(wiki_id, {}).iteritems())
+        title_confirmation.wiki_cache().set(key, redirects, size=title_confirmation.estimate_size(redirects))
+    return redirects
 
 
 def sanitizePhrase(phrase):
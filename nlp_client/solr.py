@@ -0,0 +1,279 @@
+from requests.adapters import HTTPAdapter
+import requests
+import threading
+import socket
+import random
+import json
+import time
+import re
+
+'''
+Shared Solr client: one pooled keep-alive session, a load-balanced list of endpoints,
+timeouts, retries with exponential backoff, and per-core latency histograms.
+'''
+
+SOLR_ENDPOINTS = ['http://search-s10:8983']
+
+'''
+Seconds to wait for a connection and for a response
+'''
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 30
+
+'''
+Failed requests are retried against the next endpoint, waiting BACKOFF * 2^attempt seconds, jittered
+'''
+RETRIES = 3
+BACKOFF = 0.25
+
+'''
+Keep-alive connections kept per endpoint; set this to at least the number of threads sharing the client
+'''
+POOL_SIZE = 10
+
+'''
+Most documents fetched by one get_many request; keeps the query string well under URL length limits
+'''
+BATCH_SIZE = 100
+
+'''
+Characters with a meaning in Lucene query syntax
+'''
+SPECIAL_CHARACTERS = re.compile(r'([+\-&|!(){}\[\]^"~*?:\\/ ])')
+
+'''
+Upper bounds, in seconds, of the latency histogram buckets
+'''
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+CLIENT = None
+
+
+class SolrServerError(requests.HTTPError):
+    ''' A 5xx response, which is worth retrying elsewhere '''
+    pass
+
+
+'''
+Errors worth trying again; anything else, like a 400 for a malformed query, fails straight away
+'''
+RETRIED_ERRORS = (requests.ConnectionError, requests.Timeout, SolrServerError, socket.error)
+
+
+class LatencyHistogram:
+
+    ''' Counts of request latencies in LATENCY_BUCKETS, plus failures and retries '''
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total_seconds = 0.0
+        self.errors = 0
+        self.retries = 0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        ''' Records a successful request
+        :param seconds: how long it took
+        '''
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                index = i
+                break
+        with self.lock:
+            self.counts[index] += 1
+            self.total_seconds += seconds
+
+    def failed(self, retrying):
+        ''' Records a failed attempt
+        :param retrying: whether it's going to be retried
+        '''
+        with self.lock:
+            if retrying:
+                self.retries += 1
+            else:
+                self.errors += 1
+
+    def stats(self):
+        ''' The histogram as a dict, keyed by "<=bound" and ">last bound" '''
+        with self.lock:
+            count = sum(self.counts)
+            buckets = dict([('<=%s' % bound, self.counts[i]) for i, bound in enumerate(self.buckets)])
+            buckets['>%s' % self.buckets[-1]] = self.counts[-1]
+            return {'count': count,
+                    'mean': self.total_seconds / count if count else None,
+                    'errors': self.errors,
+                    'retries': self.retries,
+                    'buckets': buckets}
+
+
+class SolrClient:
+
+    ''' A pooled client for one or more interchangeable Solr endpoints '''
+
+    def __init__(self, endpoints=None, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 retries=RETRIES, backoff=BACKOFF, pool_size=POOL_SIZE):
+        ''' Constructor method
+        :param endpoints: a list of base urls, e.g. http://search-s10:8983; requests are spread over them
+        :param connect_timeout: seconds to wait for a connection
+        :param read_timeout: seconds to wait for a response
+        :param retries: how many times to retry a failed request
+        :param backoff: seconds to wait before the first retry; doubles after each
+        :param pool_size: keep-alive connections to keep per endpoint
+        '''
+        self.endpoints = list(endpoints or SOLR_ENDPOINTS)
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.endpoints), pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.next_endpoint = random.randrange(len(self.endpoints))
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def histogram(self, core):
+        with self.lock:
+            if core not in self.histograms:
+                self.histograms[core] = LatencyHistogram()
+            return self.histograms[core]
+
+    def request(self, method, core, handler, params=None, data=None, headers=None):
+        ''' Sends a request to a core, retrying on connection errors, timeouts and 5xx responses
+        :param method: GET or POST
+        :param core: the Solr core, e.g. main or xwiki
+        :param handler: the request handler, e.g. select
+        :param params: query string parameters; wt defaults to json
+        :param data: a request body
+        :param headers: extra request headers
+        :return: the decoded JSON response
+        :raises requests.RequestException: if the last retry fails too
+        '''
+        params = dict(params or {})
+        params.setdefault('wt', 'json')
+        histogram = self.histogram(core)
+        with self.lock:
+            first = self.next_endpoint
+            self.next_endpoint = (self.next_endpoint + 1) % len(self.endpoints)
+        for attempt in range(self.retries + 1):
+            url = '%s/solr/%s/%s' % (self.endpoints[(first + attempt) % len(self.endpoints)], core, handler)
+            start = time.time()
+            try:
+                response = self.session.request(method, url, params=params, data=data, headers=headers, timeout=self.timeout)
+                if response.status_code >= 500:
+                    raise SolrServerError('%d from %s' % (response.status_code, url), response=response)
+                response.raise_for_status()
+                result = response.json()
+            except (requests.RequestException, socket.error, ValueError) as e:
+                retrying = attempt < self.retries and isinstance(e, RETRIED_ERRORS)
+                histogram.failed(retrying)
+                if not retrying:
+                    raise
+                time.sleep(self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+                continue
+            histogram.observe(time.time() - start)
+            return result
+
+    def select(self, core, params):
+        ''' Runs a query
+        :param core: the Solr core, e.g. main or xwiki
+        :param params: query parameters, e.g. {'q': 'id:123_45', 'fl': 'id,html_en'}
+        :return: the decoded JSON response
+        '''
+        return self.request('GET', core, 'select', params)
+
+    def docs(self, core, params):
+        ''' Runs a query and returns just the matching documents '''
+        return self.select(core, params).get('response', {}).get('docs', [])
+
+    def get_many(self, core, ids, fl=None, batch_size=BATCH_SIZE, realtime=False):
+        ''' Fetches documents by id, batch_size at a time
+        :param core: the Solr core
+        :param ids: an iterable of document ids
+        :param fl: a comma-separated list of fields to return; the id is always included
+        :param batch_size: most ids per request
+        :param realtime: use the real-time get handler, which also sees uncommitted documents
+        :return: a dict of id to document, or None for ids that weren't found
+        '''
+        ids = list(ids)
+        fields = None
+        if fl is not None:
+            fields = [field.strip() for field in fl.split(',') if field.strip()]
+            fields = ','.join(fields if 'id' in fields else ['id'] + fields)
+        documents = dict([(id, None) for id in ids])
+        for i in range(0, len(ids), batch_size):
+            batch = ids[i:i+batch_size]
+            if realtime:
+                params = {'ids': ','.join(batch)}
+                handler = 'get'
+            else:
+                params = {'q': ids_query(batch), 'rows': len(batch)}
+                handler = 'select'
+            if fields is not None:
+                params['fl'] = fields
+            response = self.request('GET', core, handler, params)
+            for doc in response.get('response', {}).get('docs', []):
+                documents[doc['id']] = doc
+        return documents
+
+    def update(self, core, documents):
+        ''' Posts JSON updates to a core
+        :param core: the Solr core
+        :param documents: the JSON update body, e.g. a list of documents
+        '''
+        return self.request('POST', core, 'update', data=json.dumps(documents),
+                            headers={'Content-type': 'application/json'})
+
+    def stats(self):
+        ''' Latency histograms keyed by core '''
+        with self.lock:
+            histograms = self.histograms.items()
+        return dict([(core, histogram.stats()) for core, histogram in histograms])
+
+
+def escape(value):
+    ''' Escapes a value for use as a term in a Lucene query '''
+    return SPECIAL_CHARACTERS.sub(r'\\\1', value)
+
+
+def ids_query(ids, field='id'):
+    ''' A query matching any of a list of ids, e.g. id:(123_45 OR 123_46) '''
+    return '%s:(%s)' % (field, ' OR '.join([escape(id) for id in ids]))
+
+
+def client(new_client=None):
+    ''' Access & mutate the shared client
+    :param new_client: a SolrClient to use from now on
+    :return: the shared SolrClient
+    '''
+    global CLIENT
+    if new_client is not None:
+        CLIENT = new_client
+    if CLIENT is None:
+        CLIENT = SolrClient()
+    return CLIENT
+
+
+def reset_client():
+    ''' Drops the shared client, e.g. in a forked worker that can't share its parent's connections '''
+    global CLIENT
+    CLIENT = None
+
+
+def configure(config_file='nlp-config.json', host=None):
+    ''' Sets up the shared client from the "solr" section of a host in nlp-config.json:
+    { host : { 'solr': { 'endpoints': [...], 'connect_timeout': ..., 'read_timeout': ...,
+                         'retries': ..., 'backoff': ..., 'pool_size': ... } } }
+    :param config_file: path to the host config
+    :param host: the host to configure for; defaults to this machine's hostname
+    :return: the SolrClient
+    '''
+    config = json.loads(open(config_file).read()).get(host or socket.gethostname(), {}).get('solr', {})
+    return client(SolrClient(config.get('endpoints'),
+                             config.get('connect_timeout', CONNECT_TIMEOUT),
+                             config.get('read_timeout', READ_TIMEOUT),
+                             config.get('retries', RETRIES),
+                             config.get('backoff', BACKOFF),
+                             config.get('pool_size', POOL_SIZE)))
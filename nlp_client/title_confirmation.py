@@ -9,6 +9,9 @@ from gzip import GzipFile, open as gzopen
 from StringIO import StringIO
 from urllib import quote_plus
 from nltk.corpus import stopwords
+from itertools import izip
+from title_index import TitleIndex
+from caching import LocalCache
 import os
 import sys
 import zlib
@@ -19,7 +22,70 @@ import time
 import sqlite3 as lite
 
 """ Memoization variables """
-TITLES, REDIRECTS, CURRENT_WIKI_ID, USE_S3, WP_SEEN, ALL_WP, SQLITE_CONNECTION = [], {}, None, True, [], {}, None
+CURRENT_WIKI_ID, USE_S3, ALL_WP, SQLITE_CONNECTION = None, True, {}, None
+
+""" Titles and redirects for the most recently used wikis, bounded by count and by estimated bytes """
+WIKI_CACHE_MAX_WIKIS = 16
+WIKI_CACHE_MAX_BYTES = 512 * 1024 * 1024
+WIKI_CACHE = None
+
+""" Bounds on the memos in front of preprocess and the wikipedia title lookup """
+PREPROCESS_MEMO_SIZE = 200000
+WP_MEMO_SIZE = 200000
+
+""" SQLite allows at most 999 bound parameters per statement """
+SQLITE_BATCH_SIZE = 500
+
+STOPWORDS = None
+TITLE_INDEX = None
+PARENTHETICAL = re.compile(' \(\w+\)')
+
+
+class LRUMemo:
+    """ An approximately least-recently-used memo, kept as two generations of plain dicts.
+    Hits in the old generation are promoted to the new one; when the new one fills up,
+    the old one is dropped. Each operation is a couple of dict operations, so it's cheap
+    enough to sit in front of preprocess, and safe to share between threads without a lock.
+    """
+
+    def __init__(self, max_size):
+        """ Constructor method
+        :param max_size: roughly the most entries to keep
+        """
+        self.generation_size = max(1, max_size / 2)
+        self.current = {}
+        self.previous = {}
+
+    def get(self, key, default=None):
+        try:
+            return self.current[key]
+        except KeyError:
+            pass
+        try:
+            value = self.previous[key]
+        except KeyError:
+            return default
+        self.set(key, value)
+        return value
+
+    def set(self, key, value):
+        current = self.current
+        current[key] = value
+        if len(current) >= self.generation_size:
+            self.previous = current
+            self.current = {}
+
+    def clear(self):
+        self.current = {}
+        self.previous = {}
+
+    def __len__(self):
+        return len(self.current) + len(self.previous)
+
+
+PREPROCESS_MEMO = LRUMemo(PREPROCESS_MEMO_SIZE)
+WP_SEEN = LRUMemo(WP_MEMO_SIZE)
+WP_UNSEEN = LRUMemo(WP_MEMO_SIZE)
 
 yml = '/usr/wikia/conf/current/DB.yml'
 app = Flask(__name__)
@@ -90,78 +156,203 @@ def define_options():
     return options
 
 
+def stopword_set():
+    """ The english stopwords, loaded once """
+    global STOPWORDS
+    if STOPWORDS is None:
+        STOPWORDS = frozenset(stopwords.words('english'))
+    return STOPWORDS
+
 def preprocess(title):
-    """ Mutate each title to the appropriate pre-processed value
+    """ Mutate each title to the appropriate pre-processed value, memoized
     :param row: cursor title
     """
-    stops = stopwords.words('english')
-    return ' '.join(filter(lambda x: x not in stops, re.sub(' \(\w+\)', '', title.lower().replace('_', ' ')).split(' ')))[:500] #500 chars should be plenty, todo fix unicode shit
+    ppt = PREPROCESS_MEMO.get(title)
+    if ppt is None:
+        stops = stopword_set()
+        ppt = ' '.join([word for word in PARENTHETICAL.sub('', title.lower().replace('_', ' ')).split(' ') if word not in stops])[:500] #500 chars should be plenty, todo fix unicode shit
+        PREPROCESS_MEMO.set(title, ppt)
+    return ppt
+
+def clear_memos():
+    """ Forgets every memoized preprocess and wikipedia lookup result """
+    PREPROCESS_MEMO.clear()
+    WP_SEEN.clear()
+    WP_UNSEEN.clear()
+
+def use_title_index(path='wp_titles.idx'):
+    """ Answers wikipedia title lookups from a memory-mapped title_index instead of SQLite
+    :param path: an index written by title_index.build, or None to go back to SQLite
+    """
+    global TITLE_INDEX
+    if TITLE_INDEX is not None:
+        TITLE_INDEX.close()
+    TITLE_INDEX = TitleIndex(path) if path is not None else None
+    return TITLE_INDEX
 
 def check_wp(title):
-    """ Checks if a "title" is a title in wikipedia first using memoization cache, then check_wp_s3
+    """ Checks if a "title" is a title in wikipedia, using the title index if there is one,
+    otherwise the memoization cache, then check_wp_sqlite
     :param title: string
     """
-    global WP_SEEN
     ppt = preprocess(title)
-    bool = ppt in WP_SEEN or check_wp_sqlite(ppt)
-    return bool 
+    if TITLE_INDEX is not None:
+        return ppt in TITLE_INDEX
+    if WP_SEEN.get(ppt):
+        return True
+    if WP_UNSEEN.get(ppt):
+        return False
+    return check_wp_sqlite(ppt)
+
+def check_wp_many(titles):
+    """ Checks many "titles" at once; the ones we haven't seen are looked up in batches
+    :param titles: an iterable of strings
+    :return: the set of the given titles that are titles in wikipedia
+    """
+    if TITLE_INDEX is not None:
+        return set([title for title in set(titles) if preprocess(title) in TITLE_INDEX])
+
+    by_ppt = {}
+    for title in set(titles):
+        by_ppt.setdefault(preprocess(title), []).append(title)
+
+    confirmed, unknown = set(), []
+    for ppt, originals in by_ppt.items():
+        if WP_SEEN.get(ppt):
+            confirmed.update(originals)
+        elif not WP_UNSEEN.get(ppt):
+            unknown.append(ppt)
+
+    for ppt in check_wp_sqlite_many(unknown):
+        confirmed.update(by_ppt[ppt])
+    return confirmed
 
 
+def _as_sqlite_text(title):
+    """ Titles come back from SQLite as utf-8 str, since the connection's text_factory is str """
+    return title.encode('utf-8') if isinstance(title, unicode) else title
+
 def check_wp_sqlite(title):
-    global WP_SEEN
-    conn = get_sqlite_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM `titles` where `title` = \"%s\"" % (title.replace('"', '""')))
+    """ Looks a preprocessed title up in the wikipedia titles table, memoizing the result
+    :param title: preprocessed string
+    """
+    cursor = get_sqlite_connection().cursor()
+    cursor.execute("SELECT 1 FROM `titles` WHERE `title` = ?", (title,))
     if cursor.fetchone() is not None:
-        WP_SEEN += [title]
+        WP_SEEN.set(title, True)
         return True
+    WP_UNSEEN.set(title, True)
     return False
 
+def check_wp_sqlite_many(titles):
+    """ Looks preprocessed titles up in the wikipedia titles table, SQLITE_BATCH_SIZE at a time,
+    memoizing the results
+    :param titles: a list of preprocessed strings
+    :return: the set of those titles that are in the table
+    """
+    found = set()
+    cursor = get_sqlite_connection().cursor()
+    for i in range(0, len(titles), SQLITE_BATCH_SIZE):
+        batch = titles[i:i+SQLITE_BATCH_SIZE]
+        cursor.execute("SELECT `title` FROM `titles` WHERE `title` IN (%s)" % ', '.join(['?'] * len(batch)), batch)
+        rows = set([row[0] for row in cursor])
+        for title, text in izip(batch, map(_as_sqlite_text, batch)):
+            if text in rows:
+                WP_SEEN.set(title, True)
+                found.add(title)
+            else:
+                WP_UNSEEN.set(title, True)
+    return found
+
+
+def wiki_cache(max_wikis=None, max_bytes=None):
+    """ Access & mutate the cache of per-wiki titles and redirects. Passing either value rebuilds it.
+    services also keeps the typed forms of AllTitlesService and RedirectsService responses here,
+    so a wiki can have up to four entries.
+    :param max_wikis: the most wikis to hold
+    :param max_bytes: the most estimated bytes to hold
+    :return: a caching.LocalCache
+    """
+    global WIKI_CACHE, WIKI_CACHE_MAX_WIKIS, WIKI_CACHE_MAX_BYTES
+    if max_wikis is not None or max_bytes is not None:
+        if max_wikis is not None:
+            WIKI_CACHE_MAX_WIKIS = max_wikis
+        if max_bytes is not None:
+            WIKI_CACHE_MAX_BYTES = max_bytes
+        WIKI_CACHE = None
+    if WIKI_CACHE is None:
+        WIKI_CACHE = LocalCache(WIKI_CACHE_MAX_BYTES, None, 4 * WIKI_CACHE_MAX_WIKIS)
+    return WIKI_CACHE
+
+def estimate_size(container):
+    """ Roughly how many bytes a set or dict of strings takes up, counting shared strings once """
+    strings = container
+    if isinstance(container, dict):
+        strings = set([string for item in container.iteritems() for string in item])
+    return sys.getsizeof(container) + sum([sys.getsizeof(string) for string in strings])
+
+def get_s3_gz_contents(key_name):
+    """ Downloads and gunzips an object from the nlp-data bucket """
+    bucket = connect_s3().get_bucket('nlp-data')
+    key = bucket.get_key(key_name)
+    io = StringIO()
+    key.get_file(io)
+    io.seek(0)
+    return GzipFile(fileobj=io, mode='r').read()
 
 def get_titles_for_wiki_id(wiki_id):
-    global TITLES, CURRENT_WIKI_ID, USE_S3
-    if wiki_id == CURRENT_WIKI_ID and len(TITLES) > 0:
-        return TITLES
+    """ The preprocessed titles of a wiki's content pages
+    :param wiki_id: the id of the wiki
+    :return: a frozenset
+    """
+    global CURRENT_WIKI_ID
+    cache_key = 'titles/%s' % wiki_id
+    titles = wiki_cache().get(cache_key)
+    if titles is not None:
+        return titles
 
     if USE_S3:
-        bucket = connect_s3().get_bucket('nlp-data')
-        key = bucket.get_key('article_titles/%s.gz' % str(wiki_id))
-        io = StringIO()
-        key.get_file(io)
-        io.seek(0)
-        stringdata = GzipFile(fileobj=io, mode='r').read().decode('ISO-8859-2').encode('utf-8')
-        TITLES = json.loads(stringdata)[wiki_id]
+        stringdata = get_s3_gz_contents('article_titles/%s.gz' % str(wiki_id)).decode('ISO-8859-2').encode('utf-8')
+        titles = frozenset(json.loads(stringdata)[wiki_id])
     else:
         local_db = get_local_db_from_wiki_id(get_global_db(), wiki_id)
-        CURRENT_WIKI_ID = wiki_id
         cursor = local_db.cursor()
         cursor.execute("SELECT page_title FROM page WHERE page_namespace IN (%s)" % ", ".join(map(str, get_namespaces(get_global_db(), wiki_id))))
-        TITLES = set(map(lambda x: preprocess(x[0]), cursor))
+        titles = frozenset(map(lambda x: preprocess(x[0]), cursor))
 
     CURRENT_WIKI_ID = wiki_id
-    return TITLES
+    wiki_cache().set(cache_key, titles, size=estimate_size(titles))
+    return titles
+
+def compact_redirects(pairs):
+    """ Builds a redirect dict in which every repeated canonical title is one shared string
+    :param pairs: an iterable of (redirect, canonical title)
+    """
+    canonical_titles = {}
+    return dict([(redirect, canonical_titles.setdefault(title, title)) for redirect, title in pairs])
 
 def get_redirects_for_wiki_id(wiki_id):
-    global REDIRECTS, CURRENT_WIKI_ID, USE_S3
-    if wiki_id == CURRENT_WIKI_ID and len(REDIRECTS) > 0:
-        return REDIRECTS
+    """ A wiki's preprocessed redirects
+    :param wiki_id: the id of the wiki
+    :return: a dict of redirect to canonical title
+    """
+    global CURRENT_WIKI_ID
+    cache_key = 'redirects/%s' % wiki_id
+    redirects = wiki_cache().get(cache_key)
+    if redirects is not None:
+        return redirects
 
     if USE_S3:
-        bucket = connect_s3().get_bucket('nlp-data')
-        key = bucket.get_key('article_redirects/%s.gz' % str(wiki_id))
-        io = StringIO()
-        key.get_file(io)
-        io.seek(0)
-        stringdata = GzipFile(fileobj=io, mode='r').read()
-        REDIRECTS = json.loads(stringdata)[wiki_id]
+        redirects = compact_redirects(json.loads(get_s3_gz_contents('article_redirects/%s.gz' % str(wiki_id)))[wiki_id].iteritems())
     else:
         local_db = get_local_db_from_wiki_id(get_global_db(), wiki_id)
         cursor = local_db.cursor()
         cursor.execute("SELECT page_title, rd_title FROM redirect INNER JOIN page ON page_id = rd_from")
-        REDIRECTS = dict([map(preprocess, row) for row in cursor])
+        redirects = compact_redirects([map(preprocess, row) for row in cursor])
 
     CURRENT_WIKI_ID = wiki_id
-    return REDIRECTS
+    wiki_cache().set(cache_key, redirects, size=estimate_size(redirects))
+    return redirects
 
 def get_sqlite_connection():
     global SQLITE_CONNECTION
@@ -0,0 +1,122 @@
+from struct import Struct
+from array import array
+import mmap
+import zlib
+import sys
+
+'''
+Read-only, memory-mapped index of preprocessed Wikipedia titles, an alternative to the
+wp_titles.db SQLite table for check_wp.
+The file is a header, an open-addressing hash table of title numbers, the offsets of each title,
+then the titles themselves, sorted and utf-8 encoded. A lookup hashes the title with crc32 and
+probes the table, which usually takes one or two probes. All of it reads from the mapping, so
+there are no syscalls per lookup, and every process on a host shares the same pages.
+'''
+
+MAGIC = 'WPTI'
+VERSION = 1
+HEADER = Struct('<4sBxxxII')  # magic, version, number of titles, number of slots
+UINT32 = Struct('<I')
+UINT32_PAIR = Struct('<II')
+
+'''
+The hash table is kept at most half full
+'''
+LOAD_FACTOR = 0.5
+
+
+def _uint32_array(values=()):
+    ''' An array of little-endian unsigned 32-bit ints, whatever this platform calls them '''
+    typecode = 'I' if array('I').itemsize == 4 else 'L'
+    return array(typecode, values)
+
+
+def _write_uint32_array(out, values):
+    if sys.byteorder != 'little':
+        values.byteswap()
+    values.tofile(out)
+
+
+def build(titles, path):
+    ''' Writes an index of titles
+    :param titles: an iterable of preprocessed titles, as str or unicode; duplicates are fine
+    :param path: where to write the index
+    :return: the number of distinct titles written
+    '''
+    titles = sorted(set([title.encode('utf-8') if isinstance(title, unicode) else title for title in titles]))
+    slot_count = 1
+    while slot_count * LOAD_FACTOR < max(len(titles), 1):
+        slot_count *= 2
+    mask = slot_count - 1
+
+    slots = _uint32_array([0]) * slot_count
+    offsets = _uint32_array()
+    offset = 0
+    for number, title in enumerate(titles):
+        offsets.append(offset)
+        offset += len(title)
+        slot = zlib.crc32(title) & mask
+        while slots[slot]:
+            slot = (slot + 1) & mask
+        slots[slot] = number + 1
+    if offset > 0xffffffff:
+        raise ValueError('Titles are too large for a version %d index' % VERSION)
+    offsets.append(offset)
+
+    out = open(path, 'wb')
+    out.write(HEADER.pack(MAGIC, VERSION, len(titles), slot_count))
+    _write_uint32_array(out, slots)
+    _write_uint32_array(out, offsets)
+    for title in titles:
+        out.write(title)
+    out.close()
+    return len(titles)
+
+
+class TitleIndex:
+
+    ''' A title index opened for lookups '''
+
+    def __init__(self, path):
+        ''' Constructor method
+        :param path: the path of an index written by build
+        :raises ValueError: if the file isn't a title index, or was written by another version
+        '''
+        self.path = path
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.map) < HEADER.size:
+            raise ValueError('Not a title index: %s' % path)
+        magic, version, self.count, self.slot_count = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError('Not a title index: %s' % path)
+        if version != VERSION:
+            raise ValueError('Title index version %d is not %d: %s' % (version, VERSION, path))
+        self.mask = self.slot_count - 1
+        self.slots_start = HEADER.size
+        self.offsets_start = self.slots_start + 4 * self.slot_count
+        self.titles_start = self.offsets_start + 4 * (self.count + 1)
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, title):
+        ''' Whether a preprocessed title is in the index
+        :param title: str or unicode
+        '''
+        if isinstance(title, unicode):
+            title = title.encode('utf-8')
+        index_map = self.map
+        slot = zlib.crc32(title) & self.mask
+        while True:
+            number = UINT32.unpack_from(index_map, self.slots_start + 4 * slot)[0]
+            if not number:
+                return False
+            start, end = UINT32_PAIR.unpack_from(index_map, self.offsets_start + 4 * (number - 1))
+            if end - start == len(title) and index_map[self.titles_start + start:self.titles_start + end] == title:
+                return True
+            slot = (slot + 1) & self.mask
+
+    def close(self):
+        self.map.close()
+        self.file.close()
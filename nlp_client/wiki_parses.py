@@ -1,7 +1,7 @@
 import os
-import xmltodict
 import nltk
-import requests
+import corenlp_xml
+import solr
 
 from services import PhraseService, ParsedJsonService
 
@@ -15,7 +15,7 @@ def field_for_wiki(wid, field, default=None):
 
     text = open(path, 'r').read()
     if len(text) > 0:
-        return xmltodict.parse(text)
+        return corenlp_xml.parse(text)
 
     return default
 
@@ -25,10 +25,7 @@ def phrases_for_wiki_field(wid, field):
 
 
 def main_page_nps(wid):
-    response = requests.get('http://search-s10:8983/solr/main/select', 
-                        params=dict(wt='json', q='wid:%s AND is_main_page:true' % wid, fl='id'))
-
-    docs = response.json().get('response', {}).get('docs', [{}])
+    docs = solr.client().docs('main', dict(q='wid:%s AND is_main_page:true' % wid, fl='id'))
     if not docs:
         return []
     doc_id = docs[0].get('id', None)
@@ -12,6 +12,7 @@ from socket import gethostname
 from subprocess import Popen, call
 from time import time
 from utils import chrono_sort
+from nlp_client import doc_manifest
 import tarfile
 import os
 import shutil
@@ -130,6 +131,9 @@ while True:
             key.key = new_key
             data_events += [new_key]
             key.set_contents_from_filename(xmlfilename)
+            # the compact parse was built from the old xml
+            bucket.delete_key('parse_bin/%s/%s.bin' % id_data)
+            doc_manifest.record_document(bucket, '%s_%s' % id_data)
         os.remove(xmlfilename)
 
     print "[%s] Uploaded %d files (rate of %.2f docs/sec)" % (hostname, len(xmlfiles), float(len(xmlfiles))/30.0)
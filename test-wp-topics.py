@@ -7,8 +7,8 @@ from sklearn.svm import SVC
 import os
 from nlp_client.services import WikiPageEntitiesService, WikiEntitiesService, WpWikiPageEntitiesService
 from nlp_client.caching import useCaching
+from nlp_client import solr
 import sys
-import requests
 
 wid = sys.argv[1]
 
@@ -76,7 +76,7 @@ for name in pageToEntityList:
 print "\n---Document Similarities---"
 
 
-titles = dict([(doc['id'], doc['title_en']) for doc in requests.get('http://search-s10:8983/solr/select', params={'wt':'json', 'q':'iscontent:true AND wid:'+sys.argv[1], 'rows':len(entities), 'fl':'title_en, id'}).json()['response']['docs']])
+titles = dict([(doc['id'], doc['title_en']) for doc in solr.client().docs('main', {'q':'iscontent:true AND wid:'+sys.argv[1], 'rows':len(entities), 'fl':'title_en, id'})])
 print titles 
 index = gensim.similarities.MatrixSimilarity(lsi_docs.values())
 for i, name in enumerate(pageToEntityList): 
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+Checks PhraseService.phrases_from_parse against nltk.Tree on fixed bracketed parses.
+Exits non-zero on any mismatch.
+Usage: python test_phrases.py
+"""
+
+from nlp_client.services import PhraseService
+import nltk
+import sys
+
+PARSES = [
+    # nested same-label phrases
+    '(ROOT (S (NP (NP (DT the) (NN castle)) (PP (IN of) (NP (NP (NNP Ganon)) (PP (IN in) (NP (NNP Hyrule)))))) (VP (VBD fell)) (. .)))',
+    # repeated leaves
+    '(ROOT (S (NP (NN buffalo)) (VP (VBP buffalo) (NP (NN buffalo) (NN buffalo))) (. .)))',
+    # -LRB- and -RRB- tokens
+    '(ROOT (NP (NP (NNP Link)) (PRN (-LRB- -LRB-) (NP (NN hero)) (-RRB- -RRB-))))',
+    # non-ASCII words
+    u'(ROOT (S (NP (NNP Pok\xe9mon) (NNP Zo\xeb)) (VP (VBZ r\xe9sum\xe9s) (NP (DT the) (NN caf\xe9))) (. .)))',
+    # PTB-style empty root label
+    '( (S (NP (PRP she)) (VP (VBD ran) (VP (TO to) (VP (VB go))))))',
+    # a single leaf
+    '(ROOT (NP (NN word)))',
+]
+
+LABEL_SETS = [
+    frozenset(),
+    frozenset(['NP']),
+    frozenset(['VP']),
+    frozenset(['PRN', 'PP']),
+    frozenset(['NP', 'NN', 'NNS', 'NNP', 'NNPS']),
+    frozenset(['-LRB-', '-RRB-']),
+    frozenset(['ROOT', 'S']),
+]
+
+
+def nltk_phrases(parse, labels):
+    return [' '.join(t.leaves()) for t in nltk.Tree.parse(parse).subtrees() if t.node in labels]
+
+
+mismatches = 0
+for parse in PARSES:
+    for labels in LABEL_SETS:
+        expected = nltk_phrases(parse, labels)
+        actual = PhraseService.phrases_from_parse(parse, labels)
+        if actual != expected:
+            mismatches += 1
+            print "MISMATCH %r %s\n  nltk: %r\n  fast: %r" % (parse, sorted(labels), expected, actual)
+
+print "%d checks, %d mismatches" % (len(PARSES) * len(LABEL_SETS), mismatches)
+sys.exit(1 if mismatches else 0)
@@ -1,16 +1,13 @@
-import requests
 import sys
 import traceback
 import json
 from multiprocessing import Pool
+from nlp_client import solr
 
 
 def etl_for_wiki(wid):
     wid = wid.strip()
-    r = requests.get(u'http://search-s10:8983/solr/xwiki/select/', 
-                           params=dict(wt=u'json', q=u'id:%s' % wid, fl=u'id,description_txt,sitename_txt,headline_txt', rows=1))
-
-    response = r.json()
+    response = solr.client().select(u'xwiki', dict(q=u'id:%s' % wid, fl=u'id,description_txt,sitename_txt,headline_txt', rows=1))
 
     if int(response[u'responseHeader'][u'status']) != 0:
         return